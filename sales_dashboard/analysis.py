@@ -0,0 +1,256 @@
+# analysis.py
+"""Функции для анализа (все 11 вопросов).
+
+Каждая функция принимает DataFrame либо звёздную схему / её представление
+(StarSchema, FactView) и получает данные через aggregate(): для звёздной
+схемы ответ собирается из куба, если в нём есть нужные столбцы.
+"""
+import numpy as np
+import pandas as pd
+
+from star_schema import aggregate_frame
+
+
+# Группировки, которые вкладки запрашивают у отфильтрованных данных:
+# (by, measures, столбцы условий where). По этому списку AggregationPlanner
+# заранее объединяет запросы; запросы вне списка просто выполняются напрямую.
+ANALYSIS_REQUIREMENTS = [
+    ([], {'profit': 'sum', 'netsalesamount': 'sum', 'name': 'nunique'}, []),
+    (['name'], {'profit': 'sum'}, ['categoryname', 'country']),
+    (['name'], {'profit': 'sum'}, ['country']),
+    (['country'], {'profit': 'sum', 'netsalesamount': 'sum', 'name': 'nunique'}, []),
+    (['employeename'], {'netsalesamount': 'sum'}, []),
+    (['employeename'], {'netsalesamount': 'sum', 'discount': 'mean', 'quantity': 'sum', 'profit': 'sum'}, []),
+    (['day_of_week'], {'netsalesamount': 'sum'}, ['categoryname']),
+    (['productname', 'actualunitprice'],
+     {'discount': 'mean', 'quantity': 'sum', 'netsalesamount': 'sum', 'profit': 'sum'}, ['employeename']),
+    (['productname'], {'quantity': 'sum', 'profit': 'sum'}, ['categoryname']),
+    (['year'], {'profit': 'sum', 'quantity': 'sum', 'netsalesamount': 'sum'}, ['productname']),
+    (['year'], {'profit': 'sum', 'supplierprice': 'sum'}, []),
+]
+
+
+def aggregate(data, by, measures, where=None, keep_counts=False):
+    """Группировка по by с агрегатами measures {столбец: 'sum' | 'mean' | 'nunique'}.
+
+    where - условия равенства {столбец: значение или список значений},
+    применяемые до группировки. data - DataFrame или любой источник
+    с методом aggregate (FactView, StarSchema, AggregationPlanner).
+    """
+    if not isinstance(data, pd.DataFrame):
+        return data.aggregate(by, measures, where, keep_counts)
+    for column, values in (where or {}).items():
+        values = values if isinstance(values, (list, tuple, set)) else [values]
+        data = data[data[column].isin(values)]
+    return aggregate_frame(data, list(by), measures, keep_counts=keep_counts)
+
+
+def get_key_metrics(df_to_analyze):
+    """Ключевые метрики: общая прибыль, объем продаж и число уникальных клиентов"""
+    totals = aggregate(df_to_analyze, [], {'profit': 'sum', 'netsalesamount': 'sum', 'name': 'nunique'})
+    return totals.iloc[0]
+
+def get_top_customers_by_category_country(df_to_analyze, category_name, country_name):
+    """Вопрос 1: ТОП заказчики по прибыли в категории и стране"""
+    result = aggregate(df_to_analyze, ['name'], {'profit': 'sum'},
+                       where={'categoryname': category_name, 'country': country_name})
+    if len(result) == 0:
+        return pd.DataFrame(columns=['name', 'profit'])
+    result = result.sort_values('profit', ascending=False)
+    return result.head(10)
+
+def pareto_analysis(df_to_analyze, country_name):
+    """Вопрос 2: 20% заказчиков приносят 80% прибыли в стране"""
+    customer_profit = aggregate(df_to_analyze, ['name'], {'profit': 'sum'}, where={'country': country_name})
+    if len(customer_profit) == 0 or customer_profit['profit'].sum() == 0:
+        return pd.DataFrame()
+    customer_profit = customer_profit.sort_values('profit', ascending=False)
+    customer_profit['cumulative_profit'] = customer_profit['profit'].cumsum()
+    customer_profit['cumulative_percentage'] = customer_profit['cumulative_profit'] / customer_profit['profit'].sum() * 100
+    customer_profit['customer_percentage'] = (customer_profit.index + 1) / len(customer_profit) * 100
+    return customer_profit.head(20)
+
+def get_promising_countries(df_to_analyze):
+    """Вопрос 3: Перспективные страны"""
+    country_metrics = aggregate(df_to_analyze, ['country'], {
+        'profit': 'sum',
+        'netsalesamount': 'sum',
+        'name': 'nunique'
+    })
+    country_metrics.columns = ['country', 'total_profit', 'total_sales', 'unique_customers']
+    country_metrics = country_metrics.sort_values('total_profit', ascending=False)
+    return country_metrics
+
+def get_top_managers_by_sales(df_to_analyze):
+    """Вопрос 4: Менеджеры по объему продаж"""
+    manager_sales = aggregate(df_to_analyze, ['employeename'], {'netsalesamount': 'sum'})
+    manager_sales = manager_sales.sort_values('netsalesamount', ascending=False)
+    return manager_sales
+
+def analyze_manager_discounts(df_to_analyze):
+    """Вопрос 5: Менеджеры и скидки"""
+    manager_analysis = aggregate(df_to_analyze, ['employeename'], {
+        'netsalesamount': 'sum',
+        'discount': 'mean',
+        'quantity': 'sum',
+        'profit': 'sum'
+    })
+    manager_analysis['sales_per_transaction'] = manager_analysis['netsalesamount'] / manager_analysis['quantity']
+    return manager_analysis
+
+def get_productive_weekdays(df_to_analyze, category_name):
+    """Вопрос 6: Продуктивные дни недели для категории"""
+    weekday_sales = aggregate(df_to_analyze, ['day_of_week'], {'netsalesamount': 'sum'},
+                              where={'categoryname': category_name})
+    if len(weekday_sales) == 0:
+        return pd.DataFrame()
+    day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    weekday_sales['day_of_week'] = pd.Categorical(weekday_sales['day_of_week'], categories=day_order, ordered=True)
+    weekday_sales = weekday_sales.sort_values('day_of_week')
+    return weekday_sales
+
+def get_products_by_manager(df_to_analyze, manager_name):
+    """Вопрос 7: Товары, проданные менеджером"""
+    # Цена продажи не входит в зерно куба, поэтому этот запрос всегда идёт по фактам
+    result = aggregate(df_to_analyze, ['productname', 'actualunitprice'], {
+        'discount': 'mean',
+        'quantity': 'sum',
+        'netsalesamount': 'sum',
+        'profit': 'sum'
+    }, where={'employeename': manager_name})
+    if len(result) == 0:
+        return pd.DataFrame()
+    return result
+
+def get_top_products_by_category(df_to_analyze, category_name):
+    """Вопрос 8: ТОП товаров в категории"""
+    product_performance = aggregate(df_to_analyze, ['productname'], {
+        'quantity': 'sum',
+        'profit': 'sum'
+    }, where={'categoryname': category_name})
+    if len(product_performance) == 0:
+        return pd.DataFrame()
+    product_performance = product_performance.sort_values('profit', ascending=False)
+    return product_performance.head(10)
+
+def analyze_product_trend(df_to_analyze, product_name):
+    """Вопрос 9: Анализ тренда товара"""
+    product_trend = aggregate(df_to_analyze, ['year'], {
+        'profit': 'sum',
+        'quantity': 'sum',
+        'netsalesamount': 'sum'
+    }, where={'productname': product_name})
+    if len(product_trend) == 0:
+        return pd.DataFrame()
+    return product_trend
+
+def calculate_roi(df_to_analyze):
+    """Вопрос 10: ROI по годам"""
+    yearly_metrics = aggregate(df_to_analyze, ['year'], {
+        'profit': 'sum',
+        'supplierprice': 'sum'
+    })
+    yearly_metrics['roi'] = np.where(
+        yearly_metrics['supplierprice'] != 0,
+        (yearly_metrics['profit'] / yearly_metrics['supplierprice']) * 100,
+        0
+    )
+    return yearly_metrics[['year', 'profit', 'supplierprice', 'roi']]
+
+def monthly_plan(plan_local, by=()):
+    """План по месяцам: суммы Gross_Plan и Net_Plan по by, году и месяцу; 'Date' - первое число месяца"""
+    by = list(by)
+    dates = plan_local['Date'].dt
+    plan_monthly = plan_local.assign(year=dates.year, month=dates.month).groupby(by + ['year', 'month']).agg({
+        'Gross_Plan': 'sum',
+        'Net_Plan': 'sum'
+    }).reset_index()
+    plan_monthly.insert(len(by) + 2, 'Date', pd.to_datetime(plan_monthly[['year', 'month']].assign(day=1)))
+    return plan_monthly
+
+def sales_plan_performance(df_local, plan_local, plan_monthly=None):
+    """Вопрос 11: Выполнение плана продаж.
+
+    plan_monthly - готовый результат monthly_plan(plan_local) (например, из свёрток rollups.py).
+    """
+    # Анализ плана обычно проводится по всем данным
+    actual = aggregate(df_local, ['year', 'month'], {
+        'grosssalesamount': 'sum',
+        'netsalesamount': 'sum'
+    })
+    month_start = pd.to_datetime(actual[['year', 'month']].assign(day=1))
+    actual = actual.drop(columns=['year', 'month'])
+    actual.insert(0, 'orderdate', month_start.dt.to_period('M'))
+    actual['Date'] = actual['orderdate'].dt.to_timestamp()
+    
+    if plan_monthly is None:
+        plan_monthly = monthly_plan(plan_local)
+    plan_monthly = plan_monthly[['Date', 'Gross_Plan', 'Net_Plan']]
+    
+    performance = actual.merge(plan_monthly, on='Date', how='outer')
+    performance['gross_performance'] = np.where(
+        performance['Gross_Plan'] != 0,
+        (performance['grosssalesamount'] / performance['Gross_Plan']) * 100,
+        0
+    )
+    performance['net_performance'] = np.where(
+        performance['Net_Plan'] != 0,
+        (performance['netsalesamount'] / performance['Net_Plan']) * 100,
+        0
+    )
+    return performance
+
+
+# --- Пакетные версии: результат сразу для всех значений параметра ---
+# Каждая функция делает одну группировку вместо отдельного прохода на каждое
+# значение и возвращает «длинную» таблицу, которую интерфейс индексирует
+# по столбцу параметра. Срез по одному значению совпадает с результатом
+# соответствующей функции выше.
+
+def get_top_customers_all(df_to_analyze, top_n=10):
+    """Вопрос 1 для всех пар (категория, страна): ТОП-N заказчиков по прибыли"""
+    result = aggregate(df_to_analyze, ['categoryname', 'country', 'name'], {'profit': 'sum'})
+    result = result.sort_values(['categoryname', 'country', 'profit'], ascending=[True, True, False], kind='stable')
+    return result.groupby(['categoryname', 'country'], observed=True).head(top_n).reset_index(drop=True)
+
+def pareto_analysis_all(df_to_analyze, top_n=20):
+    """Вопрос 2 для всех стран: накопленная доля прибыли через групповой cumsum"""
+    customer_profit = aggregate(df_to_analyze, ['country', 'name'], {'profit': 'sum'})
+    by_country = customer_profit.groupby('country', observed=True)['profit']
+    customer_profit = customer_profit[by_country.transform('sum') != 0]
+    by_country = customer_profit.groupby('country', observed=True)
+    # Как и в pareto_analysis, номер клиента берётся в алфавитном порядке до сортировки по прибыли
+    customer_profit = customer_profit.assign(
+        customer_percentage=(by_country.cumcount() + 1) / by_country['name'].transform('size') * 100
+    )
+    customer_profit = customer_profit.sort_values(['country', 'profit'], ascending=[True, False], kind='stable')
+    by_country = customer_profit.groupby('country', observed=True)['profit']
+    customer_profit['cumulative_profit'] = by_country.cumsum()
+    customer_profit['cumulative_percentage'] = customer_profit['cumulative_profit'] / by_country.transform('sum') * 100
+    columns = ['country', 'name', 'profit', 'cumulative_profit', 'cumulative_percentage', 'customer_percentage']
+    return customer_profit.groupby('country', observed=True).head(top_n)[columns].reset_index(drop=True)
+
+def get_productive_weekdays_all(df_to_analyze):
+    """Вопрос 6 для всех категорий: продажи по дням недели"""
+    weekday_sales = aggregate(df_to_analyze, ['categoryname', 'day_of_week'], {'netsalesamount': 'sum'})
+    day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    weekday_sales['day_of_week'] = pd.Categorical(weekday_sales['day_of_week'], categories=day_order, ordered=True)
+    return weekday_sales.sort_values(['categoryname', 'day_of_week'], kind='stable').reset_index(drop=True)
+
+def get_products_by_manager_all(df_to_analyze):
+    """Вопрос 7 для всех менеджеров: товары, цены, скидки и продажи"""
+    return aggregate(df_to_analyze, ['employeename', 'productname', 'actualunitprice'], {
+        'discount': 'mean',
+        'quantity': 'sum',
+        'netsalesamount': 'sum',
+        'profit': 'sum'
+    })
+
+def analyze_product_trend_all(df_to_analyze):
+    """Вопрос 9 для всех товаров: прибыль, количество и продажи по годам"""
+    return aggregate(df_to_analyze, ['productname', 'year'], {
+        'profit': 'sum',
+        'quantity': 'sum',
+        'netsalesamount': 'sum'
+    })
+
@@ -0,0 +1,232 @@
+# benchmark.py
+"""Нагрузочный бенчмарк загрузки, построения модели, фильтрации и анализов.
+
+Для каждого размера генерируется синтетический набор (synthetic.py), после
+чего замеряются время и пиковая память (tracemalloc) этапов. Результаты
+пишутся в JSON; с --compare сравниваются с прошлым прогоном, и этапы,
+замедлившиеся больше чем в --threshold раз, выводятся как регрессии
+(код возврата 1).
+
+    python benchmark.py --rows 10000 100000 1000000 --output bench.json
+    python benchmark.py --rows 100000 --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import analysis
+from chunked import ChunkedFactSource
+from cube import build_cube
+from data_loader import build_model, read_parquet_tables
+from planner import AggregationPlanner
+from rollups import build_rollups
+from sql_backend import DUCKDB_AVAILABLE, DuckDBSource
+from synthetic import write_dataset
+from trends import trend_scores
+
+# Фильтры боковой панели для этапа фильтрации и анализов
+BENCH_FILTERS = {
+    'years': [2016, 2017, 2018],
+    'countries': ['Германия', 'Бразилия', 'Россия', 'Франция', 'Испания'],
+}
+
+def analyses(sample_product):
+    """Функции вопросов 1-10 с параметрами, как на вкладках дашборда"""
+    return {
+        'q1_top_customers': lambda d: analysis.get_top_customers_by_category_country(d, 'Женская обувь', 'Германия'),
+        'q2_pareto': lambda d: analysis.pareto_analysis(d, 'Бразилия'),
+        'q3_countries': analysis.get_promising_countries,
+        'q4_managers': analysis.get_top_managers_by_sales,
+        'q5_manager_discounts': analysis.analyze_manager_discounts,
+        'q6_weekdays': lambda d: analysis.get_productive_weekdays(d, 'Одежда для новорожденных'),
+        'q7_manager_products': lambda d: analysis.get_products_by_manager(d, 'Матвей Крылов'),
+        'q8_top_products': lambda d: analysis.get_top_products_by_category(d, 'Пляжная одежда'),
+        'q9_product_trend': lambda d: analysis.analyze_product_trend(d, sample_product),
+        'q10_roi': analysis.calculate_roi,
+    }
+
+
+def _rows(result):
+    return len(result) if hasattr(result, '__len__') else None
+
+
+def measure(func, repeat=1, memory=True):
+    """Лучшее время из repeat запусков и пиковая память одного запуска"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, best, peak
+
+
+def run_size(data_dir, n_rows, repeat=1, memory=True):
+    """Замеры всех этапов на одном наборе данных"""
+    records = []
+
+    def stage(name, func, rows_in=None):
+        result, seconds, peak = measure(func, repeat=repeat, memory=memory)
+        records.append({
+            'rows': n_rows, 'stage': name, 'seconds': seconds, 'peak_bytes': peak,
+            'rows_in': rows_in, 'rows_out': _rows(result),
+        })
+        return result
+
+    tables = stage('load', lambda: read_parquet_tables(data_dir))
+    model, plan = stage('build_model', lambda: build_model(tables), rows_in=n_rows)
+    stage('wide_frame', model.to_frame, rows_in=n_rows)
+    stage('row_index', model.build_row_index, rows_in=n_rows)
+    stage('cube', lambda: build_cube(model), rows_in=n_rows)
+    rollups = stage('rollups', lambda: build_rollups(model, plan), rows_in=n_rows)
+    view = stage('filter', lambda: model.select(**BENCH_FILTERS), rows_in=n_rows)
+    functions = analyses(view['productname'].iloc[0] if len(view) else None)
+
+    for name, func in functions.items():
+        stage(name, lambda func=func: func(view), rows_in=len(view))
+    stage('q11_plan', lambda: analysis.sales_plan_performance(model, plan), rows_in=n_rows)
+    stage('q11_plan_rollups', lambda: analysis.sales_plan_performance(rollups.select('month'), plan, rollups.plan_monthly),
+          rows_in=len(rollups.select('month')))
+
+    # Тренды всех товаров по всем данным: по строкам фактов и по свёртке по месяцам,
+    # а также с фильтром по странам (свёртка с ключами всех фильтров)
+    periods = rollups.periods['month']
+    all_rows = model.select()
+    stage('trend_scores_facts', lambda: trend_scores(all_rows, 'product', periods, plan), rows_in=n_rows)
+    for name, rollup_view in [('trend_scores_rollups', rollups.select('month')),
+                              ('trend_scores_rollups_filtered', rollups.select('month', **BENCH_FILTERS))]:
+        stage(name, lambda rollup_view=rollup_view: trend_scores(rollup_view, 'product', periods, plan),
+              rows_in=len(rollup_view))
+
+    def all_tabs():
+        planner = AggregationPlanner(view, analysis.ANALYSIS_REQUIREMENTS)
+        for func in functions.values():
+            func(planner)
+        return analysis.get_key_metrics(planner)
+
+    stage('all_tabs_planned', all_tabs, rows_in=len(view))
+
+    # Те же вкладки без планировщика: каждая функция обращается к данным сама
+    def all_tabs_direct():
+        for func in functions.values():
+            func(view)
+        return analysis.get_key_metrics(view)
+
+    stage('all_tabs_direct', all_tabs_direct, rows_in=len(view))
+
+    # Те же вкладки потоково, блоками из fact.parquet: память ограничена размером блока
+    def all_tabs_chunked():
+        source = ChunkedFactSource(data_dir).select(**BENCH_FILTERS)
+        planner = AggregationPlanner(source, analysis.ANALYSIS_REQUIREMENTS)
+        for func in functions.values():
+            func(planner)
+        return analysis.get_key_metrics(planner)
+
+    stage('all_tabs_chunked', all_tabs_chunked, rows_in=n_rows)
+
+    # Те же вкладки SQL-запросами DuckDB к Parquet-файлам набора
+    if DUCKDB_AVAILABLE:
+        def all_tabs_duckdb():
+            source = DuckDBSource(data_dir).select(**BENCH_FILTERS)
+            planner = AggregationPlanner(source, analysis.ANALYSIS_REQUIREMENTS)
+            for func in functions.values():
+                func(planner)
+            return analysis.get_key_metrics(planner)
+
+        stage('all_tabs_duckdb', all_tabs_duckdb, rows_in=n_rows)
+
+    # Те же анализы без куба - по строкам фактов
+    cube, model.cube = model.cube, None
+    try:
+        for name in ['q3_countries', 'q5_manager_discounts', 'q10_roi']:
+            stage(f'{name}_no_cube', lambda func=functions[name]: func(view), rows_in=len(view))
+    finally:
+        model.cube = cube
+    return records
+
+
+def compare(current, previous, threshold):
+    """Этапы, время которых выросло больше чем в threshold раз"""
+    baseline = {(r['rows'], r['stage']): r['seconds'] for r in previous['results']}
+    regressions = []
+    for record in current['results']:
+        before = baseline.get((record['rows'], record['stage']))
+        # Совсем короткие этапы слишком шумные для сравнения
+        if before and record['seconds'] > threshold * before and record['seconds'] > 0.005:
+            regressions.append({**record, 'previous_seconds': before, 'ratio': record['seconds'] / before})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарк дашборда продаж на синтетических данных')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help='Размеры таблицы фактов (до 50 млн)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='Число повторов для замера времени')
+    parser.add_argument('--no-memory', action='store_true', help='Не замерять пиковую память')
+    parser.add_argument('--work-dir', help='Папка для синтетических наборов (по умолчанию - временная)')
+    parser.add_argument('--output', default='benchmark_results.json', help='Файл с результатами')
+    parser.add_argument('--compare', help='Результаты прошлого прогона для поиска регрессий')
+    parser.add_argument('--threshold', type=float, default=1.25, help='Допустимое замедление')
+    args = parser.parse_args(argv)
+
+    report = {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'python': sys.version.split()[0],
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': [],
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = args.work_dir or tmp_dir
+        for n_rows in args.rows:
+            data_dir = os.path.join(work_dir, f'rows_{n_rows}_seed_{args.seed}')
+            if not os.path.exists(os.path.join(data_dir, 'fact.parquet')):
+                write_dataset(data_dir, n_rows, seed=args.seed)
+            records = run_size(data_dir, n_rows, repeat=args.repeat, memory=not args.no_memory)
+            report['results'].extend(records)
+            for record in records:
+                peak = f"{record['peak_bytes'] / 2**20:9.1f} МБ" if record['peak_bytes'] is not None else ''
+                print(f"{n_rows:>10} {record['stage']:<30} {record['seconds'] * 1000:10.1f} мс {peak}")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'Результаты: {args.output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+        regressions = compare(report, previous, args.threshold)
+        for r in regressions:
+            print(f"РЕГРЕССИЯ {r['rows']} {r['stage']}: {r['previous_seconds'] * 1000:.1f} -> "
+                  f"{r['seconds'] * 1000:.1f} мс (x{r['ratio']:.2f})")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+# charts.py
+"""Графики Plotly для разделов дашборда (без зависимости от Streamlit).
+
+Используются и в дашборде, и в пакетном построении отчётов (report.py).
+Каждая функция принимает готовую таблицу анализа и возвращает фигуру.
+"""
+import plotly.express as px
+import plotly.graph_objects as go
+
+
+def top_customers_chart(top_customers):
+    fig = px.bar(
+        top_customers,
+        x='name',
+        y='profit',
+        title='ТОП клиентов по прибыли (Женская обувь, Германия)',
+        color='profit',
+        color_continuous_scale='tealrose'
+    )
+    fig.update_layout(xaxis_tickangle=-45)
+    return fig
+
+
+def pareto_chart(pareto_data, country="Бразилия"):
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=pareto_data['customer_percentage'],
+        y=pareto_data['cumulative_percentage'],
+        mode='lines+markers',
+        name='Кумулятивная прибыль (%)'
+    ))
+    fig.add_trace(go.Scatter(
+        x=[0, 100],
+        y=[0, 100],
+        mode='lines',
+        name='Линия равенства (20/80)',
+        line=dict(dash='dash', color='red')
+    ))
+    fig.update_layout(
+        title=f'Анализ Парето: 20% клиентов приносят 80% прибыли ({country})',
+        xaxis_title='Процент клиентов (%)',
+        yaxis_title='Кумулятивная доля прибыли (%)',
+        showlegend=True
+    )
+    return fig
+
+
+def countries_chart(countries):
+    fig = px.bar(
+        countries.head(10),
+        x='country',
+        y='total_profit',
+        title='ТОП-10 стран по общей прибыли (с фильтрами)',
+        color='total_profit',
+        color_continuous_scale='blues'
+    )
+    fig.update_layout(xaxis_tickangle=-45)
+    return fig
+
+
+def managers_chart(manager_sales):
+    fig = px.bar(
+        manager_sales,
+        x='employeename',
+        y='netsalesamount',
+        title='Объем продаж по менеджерам (с фильтрами)',
+        color='netsalesamount',
+        color_continuous_scale='sunset'
+    )
+    fig.update_layout(xaxis_tickangle=-45)
+    return fig
+
+
+def manager_discounts_chart(manager_discounts):
+    # Размер маркера не может быть отрицательным: убыточные менеджеры рисуются точкой
+    return px.scatter(
+        manager_discounts,
+        x='discount',
+        y='netsalesamount',
+        size=manager_discounts['profit'].clip(lower=0),
+        color='employeename',
+        hover_name='employeename',
+        title='Соотношение средней скидки и объема продаж по менеджерам (с фильтрами)',
+        labels={'discount': 'Средняя скидка', 'netsalesamount': 'Объем продаж (Net Sales)', 'profit': 'Прибыль'}
+    )
+
+
+def weekdays_chart(weekdays):
+    return px.bar(
+        weekdays,
+        x='day_of_week',
+        y='netsalesamount',
+        title='Объем продаж по дням недели (Одежда для новорожденных)',
+        color='netsalesamount',
+        color_continuous_scale='mint'
+    )
+
+
+def manager_products_chart(manager_products):
+    """ТОП-10 товаров менеджера по прибыли (None, если строить нечего)"""
+    top = manager_products.nlargest(10, 'profit')
+    if top.empty:
+        return None
+    fig = px.bar(
+        top,
+        x='productname',
+        y='profit',
+        title='ТОП товаров Матвея Крылова по прибыли',
+        color='profit',
+        color_continuous_scale='purp'
+    )
+    fig.update_layout(xaxis_tickangle=-45)
+    return fig
+
+
+def top_products_chart(top_products):
+    fig = px.bar(
+        top_products,
+        x='productname',
+        y=['quantity', 'profit'],
+        title='ТОП товаров категории "Пляжная одежда" (Количество и Прибыль)',
+        barmode='group'
+    )
+    fig.update_layout(xaxis_tickangle=-45)
+    return fig
+
+
+def product_trend_chart(product_trend, product):
+    return px.line(
+        product_trend,
+        x='year',
+        y='profit',
+        markers=True,
+        title=f'Динамика прибыли по товару: {product}'
+    )
+
+
+def roi_chart(roi_data):
+    return px.line(
+        roi_data,
+        x='year',
+        y='roi',
+        markers=True,
+        title='Коэффициент возврата инвестиций (ROI) по годам (с фильтрами)',
+        color_discrete_sequence=['green']
+    )
+
+
+def plan_chart(plan_performance):
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=plan_performance['Date'],
+        y=plan_performance['gross_performance'],
+        mode='lines+markers',
+        name='Выполнение плана (Gross Sales)',
+        line=dict(color='blue')
+    ))
+    fig.add_trace(go.Scatter(
+        x=plan_performance['Date'],
+        y=plan_performance['net_performance'],
+        mode='lines+markers',
+        name='Выполнение плана (Net Sales)',
+        line=dict(color='orange')
+    ))
+    fig.add_hline(y=100, line_dash="dash", line_color="red", annotation_text="100% План")
+    fig.update_layout(
+        title='Выполнение плана продаж по месяцам',
+        xaxis_title="Дата",
+        yaxis_title="Выполнение плана (%)"
+    )
+    return fig
+
+
+def delisting_chart(candidates):
+    fig = px.bar(
+        candidates,
+        x='productname',
+        y='growth',
+        title='Кандидаты на вывод из ассортимента: рост прибыли за последний период, %',
+        color='slope_pct',
+        color_continuous_scale='reds_r',
+        hover_data=['categoryname', 'slope', 'last_sale'],
+        labels={'growth': 'Рост, %', 'slope_pct': 'Наклон, % в месяц'}
+    )
+    fig.update_layout(xaxis_tickangle=-45)
+    return fig
@@ -0,0 +1,161 @@
+# chunked.py
+"""Потоковая обработка таблицы фактов, не помещающейся в память.
+
+Факты читаются блоками по chunk_rows строк из Parquet-файла (папка
+колоночного кэша или синтетического набора: fact.parquet и таблицы
+измерений). Каждый блок превращается в небольшую звёздную схему
+(только ключи и производные поля), фильтруется и сворачивается в частичные
+агрегаты, которые сразу сливаются с накопленными. Пиковая память зависит
+от размера блока и числа групп результата, а не от числа строк.
+
+ChunkedFactSource поддерживает тот же метод aggregate(), что и FactView,
+поэтому функции анализа и AggregationPlanner работают с ним без изменений;
+через aggregate_many() все группировки плана считаются за один проход.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import settings
+from data_loader import read_parquet_dimensions, read_parquet_plan
+from star_schema import FACT_SOURCE_COLUMNS, FILTER_ATTRIBUTES, StarSchema, enrich_facts
+
+
+def _additive(measures):
+    """Меры, которые можно суммировать по блокам (среднее - как сумма и количество)"""
+    return {column: func for column, func in measures.items() if func != 'nunique'}
+
+
+def _distinct(measures):
+    return [column for column, func in measures.items() if func == 'nunique']
+
+
+class _Partial:
+    """Накопленный частичный результат одного запроса aggregate"""
+
+    def __init__(self, by, measures, where):
+        self.by = list(by)
+        self.measures = dict(measures)
+        self.where = where or {}
+        self.sums = None
+        # Различные сочетания (by + столбец) для nunique
+        self.distinct = {column: None for column in _distinct(measures)}
+
+    def add(self, schema, rows):
+        for name, values in self.where.items():
+            mask = schema.filter_mask(name, values, rows)
+            rows = np.flatnonzero(mask) if rows is None else rows[mask]
+        additive = _additive(self.measures)
+        if additive or not self.distinct:
+            sums = schema.aggregate_rows(self.by, additive, rows=rows, keep_counts=True) if additive \
+                else schema.frame(self.by, rows).drop_duplicates()
+            self.sums = sums if self.sums is None else self._merge_sums(self.sums, sums)
+        for column, seen in self.distinct.items():
+            values = schema.frame(list(dict.fromkeys(self.by + [column])), rows).drop_duplicates()
+            if seen is not None:
+                values = pd.concat([seen, values], ignore_index=True).drop_duplicates()
+            self.distinct[column] = values
+
+    def _merge_sums(self, left, right):
+        combined = pd.concat([left, right], ignore_index=True)
+        if not self.by:
+            return combined.sum().to_frame().T.astype(left.dtypes.to_dict())
+        if not _additive(self.measures):
+            return combined.drop_duplicates()
+        return combined.groupby(self.by, observed=True, dropna=False).sum().reset_index()
+
+    def result(self, keep_counts=False):
+        """Итог в том же виде, что и aggregate_frame для всех строк сразу"""
+        result = None if self.sums is None else self.sums.copy()
+        for column, values in self.distinct.items():
+            if self.by:
+                counts = values.groupby(self.by, observed=True, dropna=False)[column].nunique().reset_index()
+                result = counts if result is None else result.merge(counts, on=self.by, how='left')
+            else:
+                count = values[column].nunique()
+                result = pd.DataFrame({column: [count]}) if result is None else result.assign(**{column: count})
+        if self.by:
+            # Группы с пропуском в ключе нужны только для дальнейшей агрегации (как в aggregate_frame)
+            if not keep_counts:
+                result = result.dropna(subset=self.by)
+            result = result.sort_values(self.by, ignore_index=True)
+        columns = list(self.by)
+        for column, func in self.measures.items():
+            columns.append(column)
+            if func == 'mean':
+                if keep_counts:
+                    columns.append(f'{column}_count')
+                else:
+                    result[column] = result[column] / result[f'{column}_count']
+        return result[columns].reset_index(drop=True)
+
+
+class ChunkedFactSource:
+    """Таблица фактов в Parquet, обрабатываемая блоками, с фильтрами боковой панели"""
+
+    def __init__(self, directory=None, chunk_rows=None, selection=None, dimensions=None):
+        self.directory = directory or settings.CACHE_DIR
+        self.chunk_rows = chunk_rows or settings.STREAM_CHUNK_ROWS
+        self.selection = {name: values for name, values in (selection or {}).items() if values}
+        self.dimensions = dimensions if dimensions is not None else read_parquet_dimensions(self.directory)
+        self._n_rows = None
+
+    def _path(self, name):
+        return os.path.join(self.directory, f'{name}.parquet')
+
+    def read_plan(self):
+        return read_parquet_plan(self.directory)
+
+    def select(self, years=None, countries=None, categories=None, managers=None):
+        """Тот же источник с фильтрами боковой панели (измерения не перечитываются)"""
+        selection = {'years': years, 'countries': countries, 'categories': categories, 'managers': managers}
+        return ChunkedFactSource(self.directory, self.chunk_rows, selection, self.dimensions)
+
+    def chunks(self):
+        """Блоки фактов: пары (StarSchema блока, отобранные фильтрами строки или None)"""
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(self._path('fact'))
+        batches = parquet.iter_batches(batch_size=self.chunk_rows, columns=FACT_SOURCE_COLUMNS)
+        if parquet.metadata.num_rows == 0:
+            # Батчей нет: один пустой блок, чтобы у результатов были нужные столбцы и типы
+            batches = [parquet.schema_arrow.empty_table().select(FACT_SOURCE_COLUMNS)]
+        for batch in batches:
+            fact = batch.to_pandas()
+            fact['orderdate'] = pd.to_datetime(fact['orderdate'])
+            schema = StarSchema(enrich_facts(fact, self.dimensions), self.dimensions)
+            rows = None
+            for parameter, values in self.selection.items():
+                mask = schema.filter_mask(FILTER_ATTRIBUTES[parameter], values, rows)
+                rows = np.flatnonzero(mask) if rows is None else rows[mask]
+            yield schema, rows
+
+    def aggregate_many(self, requests, keep_counts=False):
+        """Результаты нескольких запросов (by, measures, where) за один проход по фактам"""
+        partials = [_Partial(by, measures, where) for by, measures, where in requests]
+        n_rows = 0
+        for schema, rows in self.chunks():
+            n_rows += len(schema) if rows is None else len(rows)
+            for partial in partials:
+                partial.add(schema, rows)
+        self._n_rows = n_rows
+        return [partial.result(keep_counts) for partial in partials]
+
+    def aggregate(self, by, measures, where=None, keep_counts=False):
+        """Группировка с агрегатами {столбец: 'sum' | 'mean' | 'nunique'} (см. FactView.aggregate)"""
+        return self.aggregate_many([(by, measures, where)], keep_counts)[0]
+
+    def unique_values(self, name):
+        """Отсортированные значения атрибута среди отобранных строк"""
+        values = self.aggregate([name], {})[name]
+        return sorted(values.dropna().unique())
+
+    def __len__(self):
+        if self._n_rows is None:
+            self.aggregate_many([])
+        return self._n_rows
+
+    @property
+    def empty(self):
+        return len(self) == 0
@@ -0,0 +1,75 @@
+# cube.py
+"""Предагрегированный OLAP-куб продаж.
+
+Строится при загрузке: аддитивные меры суммируются по ячейкам
+(год, месяц, день недели, клиент, товар, менеджер). Страна и категория
+однозначно определяются клиентом и товаром и подставляются из измерений,
+поэтому тоже входят в зерно куба. Для средних хранится сумма и количество
+(discount и discount_count).
+
+Куб - это та же StarSchema с aggregated=True, поэтому фильтры, индекс строк
+и FactView.aggregate работают с ним так же, как с таблицей фактов.
+
+При дозагрузке продаж куб не перестраивается: update_cube прибавляет ячейки
+новых строк к существующим и дописывает новые ячейки в конец.
+"""
+import numpy as np
+import pandas as pd
+
+from star_schema import StarSchema
+
+CUBE_GRAIN = ['year', 'month', 'weekday', 'customer_key', 'product_key', 'employee_key']
+CUBE_MEASURES = ['profit', 'netsalesamount', 'grosssalesamount', 'supplierprice', 'quantity', 'discount']
+
+
+def group_cells(columns, grain):
+    """Суммы мер CUBE_MEASURES по зерну grain; columns - столбцы строк {имя: массив}"""
+    frame = pd.DataFrame({column: columns[column] for column in grain + CUBE_MEASURES})
+    frame['discount_count'] = frame['discount'].notna().astype(np.int32)
+    return frame.groupby(grain, sort=False).sum().reset_index()
+
+
+def cube_cells(schema):
+    """Ячейки куба по строкам фактов: DataFrame с зерном и суммами мер"""
+    return group_cells(schema.fact, CUBE_GRAIN)
+
+
+def build_cube(schema):
+    """Строит куб по таблице фактов звёздной схемы"""
+    cells = cube_cells(schema)
+    cube = StarSchema({column: cells[column].to_numpy() for column in cells.columns},
+                      schema.dimensions, aggregated=True)
+    cube.build_row_index()
+    return cube
+
+
+def update_cube(cube, delta):
+    """Новый куб: cube с добавленными строками фактов delta (StarSchema с теми же измерениями)"""
+    return add_cells(cube, cube_cells(delta), CUBE_GRAIN)
+
+
+def add_cells(cube, cells, grain):
+    """Новая схема ячеек: к cube (StarSchema с aggregated=True) прибавлены ячейки cells.
+
+    Суммы существующих ячеек увеличиваются, ячейки, которых ещё не было,
+    дописываются в конец; индекс строк дополняется только ими.
+    """
+    index = pd.MultiIndex.from_arrays([cube.fact[column] for column in grain])
+    positions = index.get_indexer(pd.MultiIndex.from_frame(cells[grain]))
+    existing = positions >= 0
+    new_cells = cells[~existing]
+
+    fact = {}
+    for column, values in cube.fact.items():
+        if column in grain:
+            fact[column] = values
+            continue
+        added = cells[column].to_numpy()
+        dtype = np.result_type(values, added)
+        fact[column] = values.astype(dtype)  # копия: прежний куб остаётся неизменным
+        np.add.at(fact[column], positions[existing], added[existing].astype(dtype))
+    updated = StarSchema(fact, cube.dimensions, aggregated=True)
+    updated.row_index = cube.row_index
+    new_cube = StarSchema({column: new_cells[column].to_numpy() for column in cells.columns},
+                          cube.dimensions, aggregated=True)
+    return updated.append(new_cube)
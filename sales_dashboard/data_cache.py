@@ -0,0 +1,182 @@
+# data_cache.py
+"""Колоночный кэш исходных Excel-книг.
+
+Каждая книга один раз разбирается через openpyxl и сохраняется в Parquet.
+Запись в кэше привязана к пути, mtime, размеру и SHA-256 файла: при совпадении
+mtime и размера кэш используется сразу, иначе сверяется хеш (например, после
+git checkout при деплое меняется только mtime), и книга перечитывается только
+если изменилось её содержимое.
+
+Прогрев кэша при деплое:
+    python data_cache.py [--data-dir DIR] [--cache-dir DIR] [--workers N] [--force]
+"""
+import argparse
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import settings
+
+# Увеличивается при изменении формата кэша или правил разбора книг
+CACHE_FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+
+PARQUET_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path, with_hash=True):
+    """Отпечаток файла: путь, mtime, размер и (опционально) хеш"""
+    stat = os.stat(path)
+    fingerprint = {
+        'path': os.path.abspath(path),
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+    }
+    if with_hash:
+        fingerprint['sha256'] = file_hash(path)
+    return fingerprint
+
+
+def replace_file(path, write):
+    """Записывает файл через уникальный временный файл рядом с path и подменяет path.
+
+    write(tmp_path) создаёт содержимое; при ошибке временный файл удаляется.
+    Уникальное имя не даёт двум процессам прогрева писать в один временный файл.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        # mkstemp создаёт файл с правами 0600, а кэш читают и другие пользователи
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ColumnarCache:
+    """Parquet-кэш таблиц, прочитанных из Excel"""
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or settings.CACHE_DIR
+        self.manifest_path = os.path.join(self.cache_dir, MANIFEST_NAME)
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {'version': CACHE_FORMAT_VERSION, 'tables': {}}
+        if manifest.get('version') != CACHE_FORMAT_VERSION:
+            return {'version': CACHE_FORMAT_VERSION, 'tables': {}}
+        return manifest
+
+    def _write_manifest(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        def write(tmp_path):
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        replace_file(self.manifest_path, write)
+
+    def _table_path(self, name):
+        return os.path.join(self.cache_dir, f'{name}.parquet')
+
+    def is_fresh(self, name, source_path):
+        """Проверяет, соответствует ли запись кэша текущему файлу.
+
+        Если совпал только хеш (изменился mtime), запись в манифесте обновляется.
+        """
+        entry = self.manifest['tables'].get(name)
+        if entry is None or not os.path.exists(self._table_path(name)):
+            return False
+        current = file_fingerprint(source_path, with_hash=False)
+        if entry['path'] != current['path']:
+            return False
+        if entry['mtime_ns'] == current['mtime_ns'] and entry['size'] == current['size']:
+            return True
+        if entry['size'] != current['size'] or entry['sha256'] != file_hash(source_path):
+            return False
+        entry.update(current)
+        self._write_manifest()
+        return True
+
+    def read(self, name):
+        return pd.read_parquet(self._table_path(name))
+
+    def write(self, name, source_path, table):
+        """Сохраняет таблицу и отпечаток исходного файла"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        replace_file(self._table_path(name), lambda tmp_path: table.to_parquet(tmp_path, index=False))
+        self.manifest['tables'][name] = file_fingerprint(source_path)
+        self._write_manifest()
+
+
+def build_cache(data_dir=None, cache_dir=None, force=False, workers=None):
+    """Прогревает кэш для всех исходных книг.
+
+    Возвращает пару: список пересобранных таблиц и словарь имя -> ошибка
+    для таблиц, которые не удалось сохранить в кэш.
+    """
+    from data_loader import SOURCE_FILES, read_workbooks
+
+    data_dir = data_dir or settings.DATA_DIR
+    cache = ColumnarCache(cache_dir)
+    stale = [
+        name for name, filename in SOURCE_FILES.items()
+        if force or not cache.is_fresh(name, os.path.join(data_dir, filename))
+    ]
+    stats = {}
+    if stale:
+        read_workbooks(data_dir, use_cache=True, cache_dir=cache_dir, workers=workers, force=force, stats=stats)
+    errors = stats.get('cache_errors', {})
+    return [name for name in stale if name not in errors], errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Прогрев колоночного кэша исходных Excel-книг')
+    parser.add_argument('--data-dir', default=settings.DATA_DIR, help='Папка с Excel-файлами')
+    parser.add_argument('--cache-dir', default=settings.CACHE_DIR, help='Папка для Parquet-кэша')
+    parser.add_argument('--force', action='store_true', help='Пересобрать кэш для всех книг')
+    parser.add_argument('--workers', type=int, default=settings.LOAD_WORKERS,
+                        help='Число процессов для разбора книг (0 - по числу ядер)')
+    args = parser.parse_args(argv)
+
+    if not PARQUET_AVAILABLE:
+        parser.error('Для колоночного кэша требуется пакет pyarrow')
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    started = time.perf_counter()
+    rebuilt, errors = build_cache(args.data_dir, args.cache_dir, force=args.force, workers=args.workers)
+    elapsed = time.perf_counter() - started
+    if rebuilt:
+        print(f"Пересобрано: {', '.join(rebuilt)} ({elapsed:.2f} с)")
+    elif not errors:
+        print(f'Кэш актуален ({elapsed:.2f} с)')
+    if errors:
+        for name, error in errors.items():
+            print(f"Не сохранено в кэш: {name} - {error}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+# data_loader.py
+"""Загрузка исходных книг и сборка модели данных продаж (без Streamlit)."""
+import hashlib
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import settings
+from cube import build_cube
+from data_cache import PARQUET_AVAILABLE, ColumnarCache
+from rollups import build_rollups
+from star_schema import build_dimensions, build_star_schema
+
+logger = logging.getLogger(__name__)
+
+# Имя таблицы -> файл в папке 'Визуализация'
+SOURCE_FILES = {
+    'calendar': 'Календарь.xlsx',
+    'partner': 'Контрагенты.xlsx',
+    'plan': 'План по категориям.xlsx',
+    'staff': 'Сотрудники.xlsx',
+    'products': 'Товары.xlsx',
+    'fact': 'Факт продаж.xlsx',
+}
+
+
+def parse_workbook(path):
+    """Читает первый лист книги"""
+    return pd.read_excel(path)
+
+
+def resolve_workers(workers=None):
+    workers = settings.LOAD_WORKERS if workers is None else workers
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def parse_workbooks(paths, workers=None):
+    """Разбирает книги {имя: путь}. Возвращает словарь имя -> DataFrame.
+
+    При workers > 1 книги читаются одновременно в пуле процессов, каждая целиком
+    в одном процессе. Результат совпадает с последовательным чтением через parse_workbook.
+    """
+    workers = min(resolve_workers(workers), len(paths))
+    if workers <= 1:
+        return {name: parse_workbook(path) for name, path in paths.items()}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {name: pool.submit(parse_workbook, path) for name, path in paths.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def sources_version(data_dir=None):
+    """Версия исходных данных: хеш путей, mtime и размеров всех книг"""
+    data_dir = data_dir or settings.DATA_DIR
+    fingerprints = [
+        (filename, stat.st_mtime_ns, stat.st_size)
+        for filename, stat in (
+            (filename, os.stat(os.path.join(data_dir, filename))) for filename in SOURCE_FILES.values()
+        )
+    ]
+    return hashlib.sha1(repr(fingerprints).encode('utf-8')).hexdigest()[:12]
+
+
+def read_workbooks(data_dir=None, use_cache=None, cache_dir=None, workers=None, force=False, stats=None):
+    """Читает все исходные книги. Возвращает словарь имя -> DataFrame.
+
+    При включённом кэше перечитываются только изменившиеся книги; при workers > 1
+    они разбираются параллельно. В словарь stats (если передан) записываются
+    разобранные из Excel книги, время разбора и книги, не сохранённые в кэш
+    (cache_errors: имя -> ошибка).
+    """
+    data_dir = data_dir or settings.DATA_DIR
+    if use_cache is None:
+        use_cache = settings.USE_CACHE
+    use_cache = use_cache and PARQUET_AVAILABLE
+
+    cache = ColumnarCache(cache_dir) if use_cache else None
+    paths = {name: os.path.join(data_dir, filename) for name, filename in SOURCE_FILES.items()}
+    stale = {
+        name: path for name, path in paths.items()
+        if cache is None or force or not cache.is_fresh(name, path)
+    }
+
+    started = time.perf_counter()
+    parsed = parse_workbooks(stale, workers=workers) if stale else {}
+    parse_seconds = time.perf_counter() - started
+    if stale:
+        logger.info('Разобрано книг: %d за %.2f с', len(stale), parse_seconds)
+    if stats is not None:
+        stats.update(parsed_workbooks=sorted(stale), parse_seconds=parse_seconds)
+
+    tables, cache_errors = {}, {}
+    for name, path in paths.items():
+        if name in parsed:
+            tables[name] = parsed[name]
+            if cache is not None:
+                try:
+                    cache.write(name, path, parsed[name])
+                except (TypeError, ValueError, OSError) as e:
+                    # Например, столбец со значениями разных типов (ArrowTypeError): книга работает без кэша
+                    cache_errors[name] = f'{type(e).__name__}: {e}'
+                    logger.warning("Книга '%s' не сохранена в кэш: %s", name, cache_errors[name])
+        else:
+            tables[name] = cache.read(name)
+    if stats is not None:
+        stats['cache_errors'] = cache_errors
+    return tables
+
+
+def read_parquet_tables(directory):
+    """Читает таблицы из файлов '<имя>.parquet' (формат кэша и синтетических данных)"""
+    return {name: pd.read_parquet(os.path.join(directory, f'{name}.parquet')) for name in SOURCE_FILES}
+
+
+def read_parquet_dimensions(directory):
+    """Таблицы измерений звёздной схемы из Parquet-файлов (без таблицы фактов)"""
+    tables = {
+        name: pd.read_parquet(os.path.join(directory, f'{name}.parquet'))
+        for name in ['partner', 'products', 'staff', 'calendar']
+    }
+    calendar = tables['calendar'].copy()
+    calendar['orderdate'] = pd.to_datetime(calendar['orderdate'])
+    return build_dimensions(tables['partner'], tables['products'], tables['staff'], calendar)
+
+
+def read_parquet_plan(directory):
+    plan = pd.read_parquet(os.path.join(directory, 'plan.parquet'))
+    plan['Date'] = pd.to_datetime(plan['Date'])
+    return plan
+
+
+def build_model(tables):
+    """Приводит типы и строит звёздную схему продаж. Возвращает пару (StarSchema, plan)"""
+    calendar = tables['calendar'].copy()
+    plan = tables['plan'].copy()
+    fact = tables['fact'].copy()
+
+    # Обработка данных
+    fact['orderdate'] = pd.to_datetime(fact['orderdate'])
+    calendar['orderdate'] = pd.to_datetime(calendar['orderdate'])
+    plan['Date'] = pd.to_datetime(plan['Date'])
+
+    # Узкая таблица фактов с суррогатными ключами вместо объединений с измерениями
+    model = build_star_schema(fact, tables['partner'], tables['products'], tables['staff'], calendar)
+    # Индекс строк для фильтров строится один раз при загрузке
+    model.build_row_index()
+    if settings.USE_CUBE:
+        cube = build_cube(model)
+        if len(cube) <= settings.CUBE_MAX_RATIO * len(model):
+            model.cube = cube
+            logger.info('Куб: %d ячеек', len(cube))
+        else:
+            logger.info('Куб не используется: %d ячеек на %d строк фактов', len(cube), len(model))
+    if settings.USE_ROLLUPS:
+        model.rollups = build_rollups(model, plan)
+        logger.info('Свёртки по периодам (ячеек; без свёртки - по фактам): %s',
+                    ', '.join(f'{level} {len(model.rollups.levels[level]) if level in model.rollups.levels else "-"}'
+                              f'/{len(model.rollups.compact[level]) if level in model.rollups.compact else "-"}'
+                              for level in model.rollups.periods))
+    usage = model.memory_usage()
+    logger.info('Звёздная схема: %d строк, %.1f байт/строку (широкая таблица: ~%.1f байт/строку)',
+                usage['rows'], usage['bytes_per_row'], model.wide_bytes_per_row())
+    return model, plan
+
+
+def load_data(data_dir=None, use_cache=None, cache_dir=None, workers=None):
+    """Читает книги и возвращает пару (StarSchema, plan)"""
+    version = sources_version(data_dir)
+    stats = {}
+    started = time.perf_counter()
+    tables = read_workbooks(data_dir, use_cache=use_cache, cache_dir=cache_dir, workers=workers, stats=stats)
+    stats['read_seconds'] = time.perf_counter() - started
+    started = time.perf_counter()
+    model, plan = build_model(tables)
+    stats['build_seconds'] = time.perf_counter() - started
+    model.version = version
+    model.load_stats = stats
+    return model, plan
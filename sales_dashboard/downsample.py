@@ -0,0 +1,124 @@
+# downsample.py
+"""Уменьшение объёма графиков, отправляемых в браузер.
+
+Сериализация фигуры и её отрисовка в браузере растут с числом точек.
+reduce_figure() ограничивает число точек фигуры (max_points на все
+точечные и линейные графики вместе): лишние точки отбрасываются на
+сервере алгоритмом LTTB (Largest-Triangle-Three-Buckets), который
+сохраняет форму линии, пики и провалы. Графики с большим числом точек
+переводятся в WebGL (Scattergl), который рисует их на видеокарте.
+
+Столбчатые диаграммы не меняются: в разделах они строятся по ТОП-N.
+"""
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Точечные и линейные трассы (plotly.express сам выбирает scattergl для больших рядов)
+SCATTER_TYPES = ('scatter', 'scattergl')
+# Атрибуты с отдельным значением для каждой точки, которые отбираются вместе с x и y
+PER_POINT_ATTRIBUTES = ['customdata', 'text', 'hovertext', 'ids', 'marker.size', 'marker.color', 'marker.symbol']
+
+
+def _numeric(values):
+    """Координаты как float (даты - в наносекундах) или None, если ось не числовая"""
+    values = np.asarray(values)
+    if values.dtype.kind in 'iufb':
+        return values.astype(float)
+    if values.dtype.kind == 'M':
+        return values.astype('datetime64[ns]').astype('int64').astype(float)
+    try:
+        return pd.to_datetime(pd.Series(values)).to_numpy('datetime64[ns]').astype('int64').astype(float)
+    except (ValueError, TypeError):
+        return None
+
+
+def lttb(x, y, n_out):
+    """Номера n_out точек ряда (x по возрастанию), отобранных алгоритмом LTTB.
+
+    Первая и последняя точки сохраняются. Остальные делятся на n_out - 2
+    корзины; из каждой берётся точка, образующая наибольший треугольник
+    с точкой, выбранной в предыдущей корзине, и средней точкой следующей.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            following = slice(edges[i + 1], edges[i + 2])
+            next_x, next_y = x[following].mean(), y[following].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        # Удвоенная площадь треугольника (предыдущая точка, кандидат, среднее следующей корзины)
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+
+def _thin(trace, n_out):
+    """Номера точек trace, оставляемых при ограничении n_out (None, если ряд не удаётся упорядочить)"""
+    x, y = _numeric(trace.x), _numeric(trace.y)
+    if x is None or y is None:
+        return None
+    order = np.argsort(x, kind='stable')
+    finite = np.isfinite(y[order])
+    order = order[finite]
+    return np.sort(order[lttb(x[order], y[order], n_out)])
+
+
+def _take(props, indices, n_points):
+    """Отбирает точки в словаре свойств трассы (вложенные атрибуты через точку)"""
+    for attribute in ['x', 'y'] + PER_POINT_ATTRIBUTES:
+        *path, name = attribute.split('.')
+        owner = props
+        for part in path:
+            owner = owner.get(part) if isinstance(owner, dict) else None
+        if not isinstance(owner, dict) or name not in owner:
+            continue
+        values = owner[name]
+        if isinstance(values, (list, tuple, np.ndarray)) and len(values) == n_points:
+            owner[name] = np.asarray(values)[indices]
+
+
+def reduce_figure(fig, max_points, webgl_min_points):
+    """Фигура с не более чем max_points точек в точечных и линейных графиках (0 - без ограничения).
+
+    Бюджет точек делится между трассами пропорционально их длине. Трассы
+    длиннее webgl_min_points точек (после отбора) рисуются через WebGL.
+    Фигура fig не меняется.
+    """
+    sizes = [len(trace.x) if trace.type in SCATTER_TYPES and trace.x is not None else 0 for trace in fig.data]
+    total = sum(sizes)
+    if not total or (total <= webgl_min_points and (not max_points or total <= max_points)):
+        return fig
+    data = []
+    for trace, size in zip(fig.data, sizes):
+        if not size:
+            data.append(trace)
+            continue
+        props = trace.to_plotly_json()
+        props.pop('type')
+        if max_points and total > max_points:
+            indices = _thin(trace, max(int(max_points * size / total), 3))
+            if indices is not None:
+                _take(props, indices, size)
+                size = len(indices)
+        if size > webgl_min_points:
+            data.append(go.Scattergl(props, skip_invalid=True))
+        else:
+            data.append(go.Scatter(props))
+    return go.Figure(data=data, layout=fig.layout)
+
+
+def payload_points(fig):
+    """Число точек во всех трассах фигуры"""
+    return sum(len(trace.x) for trace in fig.data if getattr(trace, 'x', None) is not None)
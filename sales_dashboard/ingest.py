@@ -0,0 +1,182 @@
+# ingest.py
+"""Дозагрузка новых продаж без полной пересборки модели.
+
+Новые строки продаж кладутся файлами в папку дельт (settings.DELTA_DIR):
+книги Excel (все листы), Parquet или CSV с теми же столбцами, что и
+'Факт продаж.xlsx'. Для них подставляются только ключи измерений и
+производные поля, строки дописываются в конец таблицы фактов, а индекс
+строк, куб и свёртки по периодам дополняются, а не строятся заново.
+Остальные книги не перечитываются.
+
+Измерения при дозагрузке не меняются: строки с новыми клиентами, товарами
+или менеджерами получают ключ -1, пока не будет выполнена полная загрузка.
+
+Файл, изменённый менее одного settings.WATCH_INTERVAL назад, ещё может
+дописываться и откладывается до следующей проверки. Файл, который не
+удалось прочитать, пропускается (ошибка - в load_stats['delta_errors'])
+и читается снова, когда изменится. Строки дельт, чьи (orderid, productid)
+уже есть в модели (например, после полной загрузки 'Факт продаж.xlsx',
+куда эти продажи уже перенесены), не дописываются повторно.
+"""
+import copy
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import settings
+from cube import update_cube
+from data_cache import file_fingerprint
+from star_schema import FACT_SOURCE_COLUMNS, StarSchema, enrich_facts
+
+logger = logging.getLogger(__name__)
+
+DELTA_EXTENSIONS = ('.xlsx', '.parquet', '.csv')
+
+
+def read_delta(path):
+    """Строки продаж из файла дельты (у книги Excel читаются все листы)"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.xlsx':
+        sheets = pd.read_excel(path, sheet_name=None)
+        frame = pd.concat([sheet for sheet in sheets.values() if not sheet.empty], ignore_index=True)
+    elif extension == '.parquet':
+        frame = pd.read_parquet(path)
+    else:
+        frame = pd.read_csv(path)
+    missing = [column for column in FACT_SOURCE_COLUMNS if column not in frame.columns]
+    if missing:
+        raise ValueError(f"В файле дельты '{os.path.basename(path)}' нет столбцов: {', '.join(missing)}")
+    frame = frame[FACT_SOURCE_COLUMNS].copy()
+    frame['orderdate'] = pd.to_datetime(frame['orderdate'])
+    return frame
+
+
+def append_facts(model, fact):
+    """Новая модель: model с дописанными строками продаж fact (исходные столбцы).
+
+    Модель model не меняется, поэтому её можно продолжать использовать,
+    пока новая не будет готова.
+    """
+    delta = StarSchema(enrich_facts(fact, model.dimensions), model.dimensions)
+    combined = model.append(delta)
+    if model.cube is not None:
+        combined.cube = update_cube(model.cube, delta)
+    if model.rollups is not None:
+        combined.rollups = model.rollups.update(delta, combined)
+    combined.version = model.version
+    combined.load_stats = dict(model.load_stats)
+    return combined
+
+
+def delta_files(delta_dir, settle_seconds=0):
+    """Файлы дельт в порядке имён: имя -> отпечаток (без хеша).
+
+    Файлы, изменённые менее settle_seconds назад, не возвращаются.
+    """
+    if not delta_dir or not os.path.isdir(delta_dir):
+        return {}
+    settled_ns = time.time_ns() - int(settle_seconds * 1e9)
+    files = {}
+    for name in sorted(os.listdir(delta_dir)):
+        if name.lower().endswith(DELTA_EXTENSIONS) and not name.startswith(('~$', '.')):
+            try:
+                fingerprint = file_fingerprint(os.path.join(delta_dir, name), with_hash=False)
+            except OSError:  # файл удалён или переименовывается
+                continue
+            if fingerprint['mtime_ns'] <= settled_ns:
+                files[name] = (fingerprint['mtime_ns'], fingerprint['size'])
+    return files
+
+
+def drop_known_rows(model, fact):
+    """Строки fact, чьих пар (orderid, productid) ещё нет в модели"""
+    known = pd.MultiIndex.from_arrays([model.fact['orderid'], model.column_values('productid')])
+    rows = pd.MultiIndex.from_arrays([fact['orderid'].to_numpy(), fact['productid'].to_numpy()])
+    return fact[~np.asarray(rows.isin(known))]
+
+
+class DeltaIngestor:
+    """Модель с применёнными дельтами из папки.
+
+    refresh() дописывает только новые файлы. Если уже применённый файл
+    изменился или удалён, дельты применяются заново к исходной модели
+    (исходные книги при этом всё равно не перечитываются).
+    """
+
+    def __init__(self, model, delta_dir=None, settle_seconds=None):
+        self.base = model
+        self.delta_dir = settings.DELTA_DIR if delta_dir is None else delta_dir
+        self.settle_seconds = settings.WATCH_INTERVAL if settle_seconds is None else settle_seconds
+        self.model = model
+        self.applied = {}
+        # Файлы, которые не удалось прочитать: имя -> (отпечаток, ошибка)
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def _read_pending(self, files, pending):
+        """Строки файлов pending; файлы с ошибками чтения пропускаются"""
+        frames, read = [], []
+        for name in pending:
+            try:
+                frames.append(read_delta(os.path.join(self.delta_dir, name)))
+            except Exception as e:  # неверные столбцы, недописанная книга и т.п.
+                logger.warning("Файл дельты '%s' пропущен: %s: %s", name, type(e).__name__, e)
+                self.errors[name] = (files[name], f'{type(e).__name__}: {e}')
+                continue
+            self.errors.pop(name, None)
+            read.append(name)
+        return frames, read
+
+    def refresh(self):
+        with self._lock:
+            files = delta_files(self.delta_dir, self.settle_seconds)
+            if any(files.get(name) != fingerprint for name, fingerprint in self.applied.items()):
+                logger.info('Применённые дельты изменились, дельты применяются заново')
+                self.model, self.applied = self.base, {}
+            self.errors = {name: error for name, error in self.errors.items() if name in files}
+            pending = [
+                name for name in files
+                if name not in self.applied and self.errors.get(name, (None,))[0] != files[name]
+            ]
+            frames, read = self._read_pending(files, pending)
+            if not frames:
+                self._report_errors(self.model)
+                return self.model
+
+            started = time.perf_counter()
+            fact = pd.concat(frames, ignore_index=True)
+            new_rows = drop_known_rows(self.model, fact)
+            if len(new_rows) < len(fact):
+                logger.info('Пропущено строк дельт, уже имеющихся в данных: %d', len(fact) - len(new_rows))
+            if len(new_rows):
+                model = append_facts(self.model, new_rows)
+            else:
+                # Все строки уже есть: данные те же, меняются только версия и сведения о дельтах
+                model = copy.copy(self.model)
+                model.load_stats = dict(self.model.load_stats)
+            self.applied.update({name: files[name] for name in read})
+            # Версия учитывает дельты, чтобы результаты из кэша по старым данным не использовались
+            model.version = hashlib.sha1(
+                repr((self.base.version, sorted(self.applied.items()))).encode('utf-8')
+            ).hexdigest()[:12]
+            duplicates = self.model.load_stats.get('delta_duplicates', 0) if self.model is not self.base else 0
+            model.load_stats.update(
+                delta_files=sorted(self.applied),
+                delta_rows=model.n_rows - self.base.n_rows,
+                delta_duplicates=duplicates + len(fact) - len(new_rows),
+                delta_seconds=time.perf_counter() - started,
+            )
+            self._report_errors(model)
+            logger.info('Дописано строк продаж: %d из %d файлов за %.2f с',
+                        len(new_rows), len(read), model.load_stats['delta_seconds'])
+            self.model = model
+            return model
+
+    def _report_errors(self, model):
+        if self.errors or 'delta_errors' in model.load_stats:
+            model.load_stats['delta_errors'] = {name: error for name, (_, error) in self.errors.items()}
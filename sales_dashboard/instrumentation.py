@@ -0,0 +1,127 @@
+# instrumentation.py
+"""Замеры горячих этапов перезапуска дашборда.
+
+Для каждого этапа (загрузка, фильтр, функции анализа, вывод таблиц и
+графиков) записываются время, число строк на входе и выходе и изменение
+RSS процесса. Дополнительно считаются события кэшей (попадания и промахи).
+Замеры выводятся в отладочной панели и пишутся в файл в формате JSON Lines
+(по строке на этап) или текстовом формате Prometheus (последний перезапуск).
+"""
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import psutil
+except ImportError:  # psutil необязателен: без него RSS читается из /proc
+    psutil = None
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss():
+    """Резидентная память процесса в байтах (None, если узнать нельзя)"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _rows(value):
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+class RunProfiler:
+    """Замеры одного перезапуска"""
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.records = []
+        self.counters = {}
+        self._stack = []
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """Замер блока кода; в выданную запись можно положить 'rows_out'"""
+        full_name = '/'.join(self._stack + [name])
+        record = {'stage': full_name, 'rows_in': rows_in, 'rows_out': None}
+        rss_before = current_rss()
+        self._stack.append(name)
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - started
+            self._stack.pop()
+            rss_after = current_rss()
+            record['memory_delta_bytes'] = (
+                rss_after - rss_before if rss_after is not None and rss_before is not None else None
+            )
+            self.records.append(record)
+
+    def call(self, name, func, *args, rows_in=None, **kwargs):
+        """Вызывает func с замером; число строк результата записывается в rows_out"""
+        with self.stage(name, rows_in=rows_in) as record:
+            result = func(*args, **kwargs)
+            record['rows_out'] = _rows(result)
+        return result
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def total_seconds(self):
+        return sum(r['seconds'] for r in self.records if '/' not in r['stage'])
+
+    def to_json_lines(self):
+        lines = []
+        for record in self.records:
+            lines.append(json.dumps({'run_id': self.run_id, 'ts': self.started_at, **record}, ensure_ascii=False))
+        lines.append(json.dumps({'run_id': self.run_id, 'ts': self.started_at, 'counters': self.counters},
+                                ensure_ascii=False))
+        return '\n'.join(lines) + '\n'
+
+    def to_prometheus(self, prefix='sales_dashboard'):
+        def label(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+        lines = []
+        metrics = [
+            ('stage_seconds', 'seconds', 'Время этапа последнего перезапуска'),
+            ('stage_rows_in', 'rows_in', 'Строк на входе этапа'),
+            ('stage_rows_out', 'rows_out', 'Строк на выходе этапа'),
+            ('stage_memory_delta_bytes', 'memory_delta_bytes', 'Изменение RSS за этап'),
+        ]
+        for metric, field, help_text in metrics:
+            lines.append(f'# HELP {prefix}_{metric} {help_text}')
+            lines.append(f'# TYPE {prefix}_{metric} gauge')
+            for record in self.records:
+                if record.get(field) is not None:
+                    lines.append(f'{prefix}_{metric}{{stage="{label(record["stage"])}"}} {record[field]}')
+        lines.append(f'# HELP {prefix}_events Счётчики событий (кэши) за перезапуск')
+        lines.append(f'# TYPE {prefix}_events gauge')
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'{prefix}_events{{event="{label(name)}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path, fmt='jsonl'):
+        """JSON Lines дописываются в файл, текст Prometheus заменяет его целиком"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        if fmt == 'prometheus':
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, path)
+        else:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(self.to_json_lines())
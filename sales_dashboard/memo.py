@@ -0,0 +1,66 @@
+# memo.py
+"""Ограниченный по размеру LRU-кэш результатов анализа со счётчиками."""
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def make_key(*parts):
+    """Хеш частей ключа (версия данных, фильтры, имя анализа, параметры)"""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш на maxsize записей (0 - кэш выключен)"""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Значение из кэша или результат compute(), сохранённый в кэш"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._items),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,144 @@
+# planner.py
+"""Общий план агрегаций для вкладок одного перезапуска.
+
+Вкладки запрашивают у отфильтрованных данных пересекающиеся группировки
+(например, по менеджеру в вопросах 4 и 5 или по клиенту в вопросах 1-3 и
+ключевых метриках). Планировщик собирает заранее объявленные запросы,
+сводит их к нескольким корневым группировкам (наборы столбцов, не входящие
+ни в один более широкий набор), выполняет каждую из них один раз и отдаёт
+вкладкам их срез: фильтр по условиям where и доагрегацию по нужным столбцам.
+
+Срез дешевле отдельной группировки, только пока корневая группировка мала.
+Поэтому, если источник умеет оценивать число различных значений атрибутов
+(distinct_estimate у StarSchema и FactView, DataFrame), узкая группировка
+сливается с более широкой лишь тогда, когда у той не более чем в
+MERGE_FACTOR раз больше групп; иначе узкая группировка считается отдельно.
+Корневая группировка, нужная только одному запросу, у таких источников
+не строится: запрос выполняется напрямую, с отбором строк по where.
+"""
+import math
+
+import pandas as pd
+
+from analysis import aggregate
+from star_schema import aggregate_frame
+
+# Во сколько раз корневая группировка может быть больше сливаемой с ней узкой
+MERGE_FACTOR = 8
+
+
+class AggregationPlanner:
+    """Источник данных для функций анализа с тем же методом aggregate()"""
+
+    def __init__(self, data, requirements=()):
+        self.data = data
+        self.requests = []
+        self.roots = None
+        self.results = {}
+        self.stats = {'requests': 0, 'planned': 0, 'direct': 0, 'groupby_runs': 0}
+        for by, measures, where_columns in requirements:
+            self.require(by, measures, where_columns)
+
+    def require(self, by, measures, where_columns=()):
+        """Объявляет группировку, которая понадобится вкладке"""
+        columns = tuple(dict.fromkeys(list(by) + list(where_columns)))
+        self.requests.append((columns, dict(measures)))
+        self.roots = None
+        self.results = {}
+
+    def _estimate(self, columns):
+        """Оценка числа групп по columns (None - источник не умеет оценивать)"""
+        if isinstance(self.data, pd.DataFrame):
+            counts = [self.data[column].nunique() for column in columns]
+        elif hasattr(self.data, 'distinct_estimate'):
+            counts = [self.data.distinct_estimate(column) for column in columns]
+        else:
+            return None
+        return min(math.prod(counts), len(self.data))
+
+    def _build_plan(self):
+        keys = {frozenset(columns): columns for columns, _ in self.requests}
+        estimates = {key: self._estimate(columns) for key, columns in keys.items()}
+        roots = {}
+        # Сначала широкие группировки: узкая становится корнем, если её не с чем слить
+        for key in sorted(keys, key=lambda key: (-(estimates[key] or 0), -len(key))):
+            if not any(key < root and self._mergeable(estimates[root], estimates[key]) for root in roots):
+                roots[key] = {'columns': list(keys[key]), 'measures': {}, 'estimate': estimates[key], 'requests': 0}
+        for columns, measures in self.requests:
+            distinct = {column for column, func in measures.items() if func == 'nunique'}
+            root = self._root_for(roots, frozenset(columns), distinct)
+            root['requests'] += 1
+            for column, func in measures.items():
+                if func == 'nunique':
+                    # Число различных значений считается по ключам корневой группировки
+                    if column not in root['columns']:
+                        root['columns'].append(column)
+                elif root['measures'].get(column) != 'mean':
+                    root['measures'][column] = func
+        self.roots = roots
+
+    @staticmethod
+    def _mergeable(root_estimate, estimate):
+        if root_estimate is None or estimate is None:
+            return True
+        return root_estimate <= MERGE_FACTOR * max(estimate, 1)
+
+    @staticmethod
+    def _root_for(roots, columns, distinct=frozenset()):
+        """Самая узкая корневая группировка, содержащая columns (лучше - и столбцы distinct)"""
+        candidates = [key for key in roots if columns <= key]
+        preferred = [key for key in candidates if distinct <= set(roots[key]['columns'])]
+        candidates = preferred or candidates
+        return roots[min(candidates, key=lambda key: (roots[key]['estimate'] or 0, len(key)))] if candidates else None
+
+    def _result(self, root):
+        key = tuple(root['columns'])
+        if key not in self.results and hasattr(self.data, 'aggregate_many'):
+            # Потоковый источник считает все корневые группировки за один проход по данным
+            roots = [r for r in self.roots.values() if tuple(r['columns']) not in self.results]
+            results = self.data.aggregate_many([(r['columns'], r['measures'], None) for r in roots],
+                                               keep_counts=True)
+            for r, result in zip(roots, results):
+                self.results[tuple(r['columns'])] = result
+            self.stats['groupby_runs'] += len(roots)
+        if key not in self.results:
+            self.results[key] = aggregate(self.data, root['columns'], root['measures'], keep_counts=True)
+            self.stats['groupby_runs'] += 1
+        return self.results[key]
+
+    def _plan_for(self, by, measures, where):
+        if self.roots is None:
+            self._build_plan()
+        if any(isinstance(v, (list, tuple, set)) for v in where.values()):
+            return None
+        distinct = {column for column, func in measures.items() if func == 'nunique'}
+        root = self._root_for(self.roots, frozenset(list(by) + list(where)), distinct)
+        if root is None:
+            return None
+        if root['requests'] == 1 and root['estimate'] is not None:
+            # Группировку не с кем делить: прямой запрос с условиями where дешевле
+            return None
+        for column, func in measures.items():
+            if func == 'nunique' and column not in root['columns']:
+                return None
+            if func != 'nunique' and column not in root['measures']:
+                return None
+            if func == 'mean' and root['measures'][column] != 'mean':
+                return None
+        return root
+
+    def aggregate(self, by, measures, where=None, keep_counts=False):
+        """Срез корневой группировки или, если запрос не объявлен, прямой запрос к данным"""
+        where = where or {}
+        self.stats['requests'] += 1
+        root = self._plan_for(by, measures, where)
+        if root is None:
+            self.stats['direct'] += 1
+            self.stats['groupby_runs'] += 1
+            return aggregate(self.data, by, measures, where, keep_counts)
+
+        self.stats['planned'] += 1
+        frame = self._result(root)
+        for column, value in where.items():
+            frame = frame[frame[column] == value]
+        return aggregate_frame(frame, list(by), measures, aggregated=True, keep_counts=keep_counts)
@@ -0,0 +1,230 @@
+# report.py
+"""Пакетное построение отчётов без Streamlit.
+
+Данные загружаются один раз; анализы считаются для сетки сочетаний фильтров
+(например, каждый год × каждая страна) в пуле процессов. Рабочие процессы
+получают уже загруженную модель: при запуске через fork она наследуется без
+копирования, иначе передаётся один раз на процесс. Для каждого сочетания в
+отдельную папку пишутся таблицы (CSV) и графики (PNG при установленном
+kaleido, иначе HTML).
+
+Пример:
+    python report.py --out reports --grid years countries --workers 0
+"""
+import argparse
+import importlib.util
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import charts
+import settings
+from analysis import (
+    ANALYSIS_REQUIREMENTS,
+    analyze_manager_discounts,
+    analyze_product_trend_all,
+    calculate_roi,
+    get_key_metrics,
+    get_products_by_manager,
+    get_productive_weekdays,
+    get_promising_countries,
+    get_top_customers_by_category_country,
+    get_top_managers_by_sales,
+    get_top_products_by_category,
+    pareto_analysis,
+    sales_plan_performance,
+)
+from chunked import ChunkedFactSource
+from data_loader import build_model, load_data, read_parquet_tables, resolve_workers
+from downsample import reduce_figure
+from ingest import DeltaIngestor
+from planner import AggregationPlanner
+from star_schema import FILTER_ATTRIBUTES
+
+logger = logging.getLogger(__name__)
+
+KALEIDO_AVAILABLE = importlib.util.find_spec('kaleido') is not None
+
+# Разделы отчёта по отфильтрованным данным: имя файла, функция, параметры, график
+REPORT_SECTIONS = [
+    ('01_top_customers', get_top_customers_by_category_country, ("Женская обувь", "Германия"),
+     charts.top_customers_chart),
+    ('02_pareto', pareto_analysis, ("Бразилия",), charts.pareto_chart),
+    ('03_countries', get_promising_countries, (), charts.countries_chart),
+    ('04_managers', get_top_managers_by_sales, (), charts.managers_chart),
+    ('05_manager_discounts', analyze_manager_discounts, (), charts.manager_discounts_chart),
+    ('06_weekdays', get_productive_weekdays, ("Одежда для новорожденных",), charts.weekdays_chart),
+    ('07_manager_products', get_products_by_manager, ("Матвей Крылов",), charts.manager_products_chart),
+    ('08_top_products', get_top_products_by_category, ("Пляжная одежда",), charts.top_products_chart),
+    # Тренды всех товаров одной таблицей: график на каждый товар в отчёт не выводится
+    ('09_product_trends', analyze_product_trend_all, (), None),
+    ('10_roi', calculate_roi, (), charts.roi_chart),
+]
+
+# Модель, загруженная в родительском процессе (общая для рабочих процессов)
+_MODEL = None
+
+
+def _init_worker(model):
+    global _MODEL
+    _MODEL = model
+
+
+def filter_grid(model, dimensions):
+    """Сочетания фильтров: список словарей {фильтр: [значение]}.
+
+    Первым идёт сочетание без фильтров (все данные).
+    """
+    values = [model.unique_values(FILTER_ATTRIBUTES[name]) for name in dimensions]
+    grid = [{}]
+    for combination in itertools.product(*values):
+        grid.append({name: [value] for name, value in zip(dimensions, combination)})
+    return grid
+
+
+def combination_name(selection):
+    """Имя папки для сочетания фильтров"""
+    if not selection:
+        return 'all'
+    parts = [f'{name}={values[0]}' for name, values in selection.items()]
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', '__'.join(parts))
+
+
+def write_chart(fig, path, chart_format):
+    """Сохраняет график; возвращает имя файла (None, если график не пишется)"""
+    if fig is None or chart_format == 'none':
+        return None
+    if chart_format == 'png':
+        fig.write_image(f'{path}.png')
+        return f'{path}.png'
+    fig.write_html(f'{path}.html', include_plotlyjs='cdn')
+    return f'{path}.html'
+
+
+def write_section(out_dir, slug, table, chart=None, chart_format='png', chart_args=()):
+    """Пишет таблицу раздела и её график; возвращает список файлов"""
+    path = os.path.join(out_dir, slug)
+    table.to_csv(f'{path}.csv', index=False)
+    files = [f'{path}.csv']
+    if chart is not None and not table.empty:
+        fig = reduce_figure(chart(table, *chart_args), settings.CHART_MAX_POINTS, settings.WEBGL_MIN_POINTS)
+        chart_file = write_chart(fig, path, chart_format)
+        if chart_file:
+            files.append(chart_file)
+    return files
+
+
+def render_combination(selection, out_dir, chart_format):
+    """Считает все разделы для одного сочетания фильтров (выполняется в рабочем процессе)"""
+    started = time.perf_counter()
+    view = _MODEL.select(**selection)
+    planned = AggregationPlanner(view, ANALYSIS_REQUIREMENTS)
+    combo_dir = os.path.join(out_dir, combination_name(selection))
+    os.makedirs(combo_dir, exist_ok=True)
+
+    files = []
+    key_metrics = get_key_metrics(planned).to_frame('value').rename_axis('metric').reset_index()
+    files += write_section(combo_dir, '00_key_metrics', key_metrics)
+    for slug, func, params, chart in REPORT_SECTIONS:
+        files += write_section(combo_dir, slug, func(planned, *params), chart, chart_format)
+    return {
+        'selection': {name: [str(v) for v in values] for name, values in selection.items()},
+        'directory': combo_dir,
+        'rows': len(view),
+        'files': [os.path.relpath(f, out_dir) for f in files],
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def load_model(data_dir=None, streaming=False):
+    """Модель из книг Excel (через кэш) или из папки с Parquet-таблицами, с дописанными дельтами.
+
+    При streaming=True факты не загружаются: возвращается потоковый источник
+    по Parquet-таблицам (по умолчанию - из колоночного кэша).
+    """
+    if streaming:
+        source = ChunkedFactSource(data_dir)
+        return source, source.read_plan()
+    if data_dir and os.path.exists(os.path.join(data_dir, 'fact.parquet')):
+        model, plan = build_model(read_parquet_tables(data_dir))
+    else:
+        model, plan = load_data(data_dir)
+    return DeltaIngestor(model).refresh(), plan
+
+
+def build_reports(out_dir, dimensions=('years', 'countries'), data_dir=None, workers=0, chart_format=None,
+                  streaming=False):
+    """Строит отчёты для всей сетки фильтров. Возвращает сводку (она же пишется в index.json)"""
+    if chart_format is None:
+        chart_format = 'png' if KALEIDO_AVAILABLE else 'html'
+    if chart_format == 'png' and not KALEIDO_AVAILABLE:
+        raise RuntimeError('Для PNG-графиков нужен пакет kaleido (pip install kaleido)')
+    started = time.perf_counter()
+    model, plan = load_model(data_dir, streaming)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # План продаж не зависит от фильтров: считается один раз
+    plan_dir = os.path.join(out_dir, 'plan')
+    os.makedirs(plan_dir, exist_ok=True)
+    plan_performance = sales_plan_performance(model, plan)
+    plan_performance['Date'] = pd.to_datetime(plan_performance['Date'])
+    plan_files = write_section(plan_dir, '11_plan', plan_performance, charts.plan_chart, chart_format)
+
+    grid = filter_grid(model, list(dimensions))
+    workers = min(resolve_workers(workers), len(grid))
+    logger.info('Сочетаний фильтров: %d, процессов: %d', len(grid), workers)
+    if workers > 1:
+        context = None
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(model,)) as pool:
+            futures = [pool.submit(render_combination, selection, out_dir, chart_format) for selection in grid]
+            results = [future.result() for future in futures]
+    else:
+        _init_worker(model)
+        results = [render_combination(selection, out_dir, chart_format) for selection in grid]
+
+    summary = {
+        'version': getattr(model, 'version', None),
+        'dimensions': list(dimensions),
+        'workers': workers,
+        'chart_format': chart_format,
+        'plan_files': [os.path.relpath(f, out_dir) for f in plan_files],
+        'combinations': results,
+        'seconds': time.perf_counter() - started,
+    }
+    with open(os.path.join(out_dir, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Пакетное построение отчётов дашборда продаж без Streamlit')
+    parser.add_argument('--out', default='reports', help='Папка для отчётов')
+    parser.add_argument('--data-dir', help='Папка с исходными книгами или Parquet-таблицами')
+    parser.add_argument('--grid', nargs='*', default=['years', 'countries'], choices=sorted(FILTER_ATTRIBUTES),
+                        help='Фильтры, по значениям которых строится сетка сочетаний')
+    parser.add_argument('--workers', type=int, default=0, help='Число процессов (0 - все ядра)')
+    parser.add_argument('--charts', choices=['png', 'html', 'none'],
+                        help='Формат графиков (по умолчанию png при установленном kaleido, иначе html)')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Читать факты блоками из Parquet, не загружая их в память целиком')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    summary = build_reports(args.out, args.grid, data_dir=args.data_dir, workers=args.workers,
+                            chart_format=args.charts, streaming=args.streaming)
+    print(f"Отчётов: {len(summary['combinations'])}, процессов: {summary['workers']}, "
+          f"{summary['seconds']:.1f} с -> {args.out}")
+
+
+if __name__ == '__main__':
+    main()
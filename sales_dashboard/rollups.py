@@ -0,0 +1,183 @@
+# rollups.py
+"""Материализованные суммы продаж по дням, месяцам и годам календаря.
+
+Строятся при загрузке вместе с кубом. У каждого уровня своё зерно: период
+(дата заказа, год и месяц или год), товар, менеджер и страна клиента.
+Клиенты в зерно не входят: вместо измерения customer у свёрток таблица
+стран, ключ customer_key - номер страны. Поэтому ячеек намного меньше,
+чем строк фактов, а фильтры боковой панели (годы, страны, категории,
+менеджеры) работают так же, как у таблицы фактов и куба: свёртка - это
+StarSchema с aggregated=True и индексом строк.
+
+Для запросов, которые не ограничивают страны и менеджеров (по умолчанию
+в боковой панели выбраны все), есть компактные свёртки с зерном период ×
+товар: годы и категории отбираются и по ним, а ячеек ещё меньше.
+
+Сочетаний дня и товара почти столько же, сколько строк фактов, поэтому на
+уровнях CATEGORY_LEVELS (по дням) в зерне вместо товара его категория:
+измерение product у них - таблица категорий, ключ product_key - номер
+категории. Такие свёртки отвечают на запросы по периоду, категории, стране
+и менеджеру, но не по товару.
+
+Свёртка полезна, только пока она намного меньше таблицы фактов: если у
+уровня ячеек больше settings.ROLLUP_MAX_RATIO от числа строк фактов, он не
+строится, а запросы к нему идут к следующему источнику - свёртке с
+ключами всех фильтров или строкам фактов.
+
+Периоды каждого уровня берутся из календаря ('Календарь.xlsx'): series()
+возвращает ряд по всем периодам календаря, периоды без продаж - нулями.
+План по месяцам (analysis.monthly_plan) считается тут же, один раз.
+"""
+import numpy as np
+import pandas as pd
+
+import settings
+from analysis import monthly_plan
+from cube import add_cells, group_cells
+from row_index import RowIndex
+from star_schema import StarSchema
+
+# Уровень -> столбцы периода (те же имена, что у таблицы фактов)
+ROLLUP_PERIODS = {
+    'day': ['orderdate', 'year', 'month'],
+    'month': ['year', 'month'],
+    'year': ['year'],
+}
+ROLLUP_KEYS = ['product_key', 'employee_key', 'customer_key']
+# Ключ компактных свёрток и атрибуты, по которым их можно фильтровать
+COMPACT_KEYS = ['product_key']
+COMPACT_FILTERS = ['year', 'categoryname']
+# Уровни, у которых в зерне вместо товара его категория
+CATEGORY_LEVELS = ['day']
+
+
+def _group_dimension(dimensions, dimension, attribute):
+    """Таблица значений атрибута измерения (ключ - код значения)"""
+    values = dimensions[dimension][attribute]
+    return pd.DataFrame({attribute: pd.Categorical(values.cat.categories, dtype=values.dtype)})
+
+
+def rollup_dimensions(dimensions, level):
+    """Измерения свёрток уровня: вместо клиентов - страны, на уровнях CATEGORY_LEVELS вместо товаров - категории"""
+    dimensions = dict(dimensions, customer=_group_dimension(dimensions, 'customer', 'country'))
+    if level in CATEGORY_LEVELS:
+        dimensions['product'] = _group_dimension(dimensions, 'product', 'categoryname')
+    return dimensions
+
+
+def _group_keys(schema, dimension, attribute, key):
+    codes = schema.dimensions[dimension][attribute].cat.codes.to_numpy()
+    # Ключ -1 (строки нет в измерении) попадает на добавленный в конец код -1
+    return np.take(np.append(codes, -1), schema.fact[key]).astype(np.int16)
+
+
+def _rollup_columns(schema, level):
+    """Столбцы строк фактов для свёрток уровня: ключ клиента заменён кодом его страны,
+    на уровнях CATEGORY_LEVELS ключ товара - кодом его категории"""
+    columns = dict(schema.fact)
+    columns['customer_key'] = _group_keys(schema, 'customer', 'country', 'customer_key')
+    if level in CATEGORY_LEVELS:
+        columns['product_key'] = _group_keys(schema, 'product', 'categoryname', 'product_key')
+    return columns
+
+
+def _calendar_periods(calendar, level):
+    """Периоды уровня по календарю: столбцы периода и 'Date' (первый день периода)"""
+    dates = pd.Series(calendar['orderdate'].sort_values().to_numpy())
+    periods = pd.DataFrame({'orderdate': dates, 'year': dates.dt.year, 'month': dates.dt.month})
+    periods = periods[ROLLUP_PERIODS[level]].drop_duplicates(ignore_index=True)
+    if level == 'day':
+        periods['Date'] = periods['orderdate']
+    else:
+        periods['Date'] = pd.to_datetime(periods[['year']].assign(month=periods.get('month', 1), day=1))
+    return periods
+
+
+def _rollup(cells, dimensions, attributes=None):
+    rollup = StarSchema({column: cells[column].to_numpy() for column in cells.columns}, dimensions, aggregated=True)
+    if attributes is None:
+        rollup.build_row_index()
+    else:
+        rollup.row_index = RowIndex.build(rollup, attributes)
+    return rollup
+
+
+class TimeRollups:
+    """Свёртки по уровням 'day', 'month', 'year', периоды календаря и месячный план.
+
+    levels - свёртки с ключами всех фильтров, compact - с зерном период × товар
+    (по дням - категория; в обоих словарях только построенные уровни), facts -
+    звёздная схема, по строкам которой отвечают уровни без свёрток.
+    """
+
+    def __init__(self, levels, compact, periods, plan_monthly=None, facts=None):
+        self.levels = levels
+        self.compact = compact
+        self.periods = periods
+        self.plan_monthly = plan_monthly
+        self.facts = facts
+
+    def _restricts(self, attribute, values):
+        """Ограничивает ли выбор values атрибута строки фактов (выбраны не все значения)"""
+        return bool(values) and self.facts.row_index.rows(attribute, values) is not None
+
+    def select(self, level, years=None, countries=None, categories=None, managers=None):
+        """Ячейки уровня level с фильтрами боковой панели (FactView с методом aggregate).
+
+        Без ограничений по странам и менеджерам берётся компактная свёртка;
+        если нужной свёртки нет - строки фактов.
+        """
+        if (level in self.compact and not self._restricts('country', countries)
+                and not self._restricts('employeename', managers)):
+            return self.compact[level].select(years=years, categories=categories)
+        source = self.levels.get(level, self.facts)
+        return source.select(years=years, countries=countries, categories=categories, managers=managers)
+
+    def series(self, level, measures, where=None, **filters):
+        """Суммы measures по всем периодам календаря уровня (без продаж - 0)"""
+        period_columns = ROLLUP_PERIODS[level]
+        values = self.select(level, **filters).aggregate(
+            period_columns, {column: 'sum' for column in measures}, where)
+        result = self.periods[level].merge(values, on=period_columns, how='left')
+        result[list(measures)] = result[list(measures)].fillna(0)
+        return result
+
+    def update(self, delta, facts):
+        """Новые свёртки с добавленными строками фактов delta (StarSchema); прежние не меняются.
+
+        facts - таблица фактов, уже дополненная строками delta.
+        """
+        levels, compact = {}, {}
+        for level, rollup in self.levels.items():
+            grain = ROLLUP_PERIODS[level] + ROLLUP_KEYS
+            levels[level] = add_cells(rollup, group_cells(_rollup_columns(delta, level), grain), grain)
+        for level, rollup in self.compact.items():
+            grain = ROLLUP_PERIODS[level] + COMPACT_KEYS
+            compact[level] = add_cells(rollup, group_cells(_rollup_columns(delta, level), grain), grain)
+        return TimeRollups(levels, compact, self.periods, self.plan_monthly, facts)
+
+    def memory_usage(self):
+        return {
+            level: sum(values.nbytes for rollups in (self.levels, self.compact) if level in rollups
+                       for values in rollups[level].fact.values())
+            for level in ROLLUP_PERIODS
+        }
+
+
+def build_rollups(schema, plan=None, max_ratio=None):
+    """Строит свёртки по дням, месяцам и годам по таблице фактов звёздной схемы.
+
+    Уровень, у которого ячеек больше max_ratio от числа строк фактов
+    (по умолчанию settings.ROLLUP_MAX_RATIO), не строится.
+    """
+    max_ratio = settings.ROLLUP_MAX_RATIO if max_ratio is None else max_ratio
+    levels, compact = {}, {}
+    for level, period_columns in ROLLUP_PERIODS.items():
+        dimensions = rollup_dimensions(schema.dimensions, level)
+        columns = _rollup_columns(schema, level)
+        for rollups, keys, attributes in [(levels, ROLLUP_KEYS, None), (compact, COMPACT_KEYS, COMPACT_FILTERS)]:
+            cells = group_cells(columns, period_columns + keys)
+            if len(cells) <= max_ratio * len(schema):
+                rollups[level] = _rollup(cells, dimensions, attributes)
+    periods = {level: _calendar_periods(schema.dimensions['calendar'], level) for level in ROLLUP_PERIODS}
+    return TimeRollups(levels, compact, periods, monthly_plan(plan) if plan is not None else None, schema)
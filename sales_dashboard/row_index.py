@@ -0,0 +1,78 @@
+# row_index.py
+"""Инвертированный индекс строк для фильтров боковой панели.
+
+Для каждого значения года, страны, категории и менеджера хранится
+отсортированный массив номеров строк таблицы фактов. Выбор в фильтре
+сводится к объединению массивов выбранных значений, а сочетание
+фильтров - к пересечению, без прохода по всем строкам.
+"""
+import numpy as np
+import pandas as pd
+
+
+def _postings(values):
+    """Значение -> отсортированные номера строк, в которых оно встречается"""
+    codes, uniques = pd.factorize(values, sort=True)
+    order = np.argsort(codes, kind='stable').astype(np.int32)
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    # Строки с пропуском (код -1) идут первыми после сортировки и в индекс не попадают
+    offset = int((codes < 0).sum())
+    bounds = offset + np.concatenate(([0], np.cumsum(counts)))
+    return {value: order[bounds[i]:bounds[i + 1]] for i, value in enumerate(uniques)}
+
+
+class RowIndex:
+    """Атрибут -> {значение -> массив номеров строк}"""
+
+    def __init__(self, postings, n_rows):
+        self.postings = postings
+        self.n_rows = n_rows
+
+    @classmethod
+    def build(cls, schema, attributes):
+        postings = {name: _postings(schema.column_values(name)) for name in attributes}
+        return cls(postings, len(schema))
+
+    def extend(self, other, offset):
+        """Индекс таблицы, к которой в конец дописаны строки с индексом other (начиная с offset)"""
+        postings = {}
+        for name, current in self.postings.items():
+            merged = dict(current)
+            for value, rows in other.postings.get(name, {}).items():
+                rows = (rows + offset).astype(np.int32)
+                # Новые строки идут после старых, поэтому массивы остаются отсортированными
+                merged[value] = np.concatenate([merged[value], rows]) if value in merged else rows
+            postings[name] = merged
+        return RowIndex(postings, self.n_rows + other.n_rows)
+
+    def rows(self, name, values):
+        """Строки, где атрибут name принимает одно из values (None - без ограничения)"""
+        postings = self.postings[name]
+        selected = {v for v in values if v in postings}
+        # Без ограничения, только если выбраны все значения и у всех строк атрибут не пропущен
+        if len(selected) == len(postings) and sum(len(rows) for rows in postings.values()) == self.n_rows:
+            return None
+        parts = [postings[v] for v in selected]
+        if not parts:
+            return np.empty(0, dtype=np.int32)
+        # Массивы разных значений не пересекаются, достаточно слить и отсортировать
+        return parts[0] if len(parts) == 1 else np.sort(np.concatenate(parts))
+
+    def select(self, conditions):
+        """Пересечение условий {атрибут: значения}. None - подходят все строки."""
+        selections = [
+            rows for rows in (self.rows(name, values) for name, values in conditions.items() if values)
+            if rows is not None
+        ]
+        if not selections:
+            return None
+        selections.sort(key=len)
+        result = selections[0]
+        for rows in selections[1:]:
+            if len(result) == 0:
+                break
+            result = np.intersect1d(result, rows, assume_unique=True)
+        return result
+
+    def memory_usage(self):
+        return sum(rows.nbytes for postings in self.postings.values() for rows in postings.values())
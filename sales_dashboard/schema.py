@@ -0,0 +1,33 @@
+# schema.py
+"""Типы столбцов модели продаж.
+
+Строковые атрибуты измерений хранятся как category, целочисленные столбцы
+сужаются до минимального типа, а дробные - до float32, только если это не
+теряет точность.
+"""
+import numpy as np
+import pandas as pd
+
+WEEKDAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Строковые измерения, по которым строятся фильтры и группировки
+DIMENSION_COLUMNS = ['name', 'city', 'country', 'productname', 'categoryname', 'employeename']
+
+
+def _downcast_float(series):
+    downcast = series.astype(np.float32)
+    if np.array_equal(downcast.to_numpy(np.float64), series.to_numpy(np.float64), equal_nan=True):
+        return downcast
+    return series
+
+
+def downcast_numeric(series):
+    """Сужает числовой столбец без потери значений; остальные типы не меняет"""
+    if pd.api.types.is_bool_dtype(series):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast='integer')
+    if pd.api.types.is_float_dtype(series):
+        return _downcast_float(series)
+    return series
+
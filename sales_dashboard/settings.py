@@ -0,0 +1,72 @@
+# settings.py
+"""Настройки приложения. Любое значение можно переопределить переменной окружения."""
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _env_flag(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# Папка с исходными Excel-файлами
+DATA_DIR = os.environ.get('SALES_DASHBOARD_DATA_DIR', os.path.join(BASE_DIR, 'Визуализация'))
+
+# Колоночный кэш (Parquet) для исходных книг
+CACHE_DIR = os.environ.get('SALES_DASHBOARD_CACHE_DIR', os.path.join(BASE_DIR, '.cache'))
+USE_CACHE = _env_flag('SALES_DASHBOARD_USE_CACHE', True)
+
+# Параллельный разбор книг: число процессов (1 - последовательно, 0 - по числу ядер)
+LOAD_WORKERS = int(os.environ.get('SALES_DASHBOARD_LOAD_WORKERS', '1'))
+
+# Предагрегированный куб для анализов и ключевых метрик
+USE_CUBE = _env_flag('SALES_DASHBOARD_USE_CUBE', True)
+# Куб не используется, если ячеек в нём больше этой доли строк фактов (он почти не сжимает данные)
+CUBE_MAX_RATIO = float(os.environ.get('SALES_DASHBOARD_CUBE_MAX_RATIO', '0.5'))
+
+# Свёртки продаж по дням, месяцам и годам календаря (rollups.py) и окно роста трендов в месяцах (trends.py)
+USE_ROLLUPS = _env_flag('SALES_DASHBOARD_USE_ROLLUPS', True)
+# Уровень свёртки строится, только если ячеек не больше этой доли строк фактов
+ROLLUP_MAX_RATIO = float(os.environ.get('SALES_DASHBOARD_ROLLUP_MAX_RATIO', '0.5'))
+TREND_WINDOW = int(os.environ.get('SALES_DASHBOARD_TREND_WINDOW', '12'))
+
+# Ленивый режим: считается только раздел, выбранный пользователем (вместо всех вкладок)
+LAZY_TABS = _env_flag('SALES_DASHBOARD_LAZY_TABS', False)
+# Число результатов анализа в LRU-кэше (0 - без кэша)
+RESULT_CACHE_SIZE = int(os.environ.get('SALES_DASHBOARD_RESULT_CACHE_SIZE', '256'))
+
+# Отладочная панель с замерами этапов в боковой панели (можно включить и переключателем)
+DEBUG_PANEL = _env_flag('SALES_DASHBOARD_DEBUG_PANEL', False)
+# Файл для замеров каждого перезапуска (пусто - не писать) и его формат: jsonl или prometheus
+PROFILE_LOG = os.environ.get('SALES_DASHBOARD_PROFILE_LOG', '')
+PROFILE_FORMAT = os.environ.get('SALES_DASHBOARD_PROFILE_FORMAT', 'jsonl')
+
+# Папка с файлами новых продаж, которые дописываются к загруженным данным без полной пересборки
+DELTA_DIR = os.environ.get('SALES_DASHBOARD_DELTA_DIR', os.path.join(DATA_DIR, 'Новые продажи'))
+
+# Размер блока строк фактов при потоковой обработке (chunked.py)
+STREAM_CHUNK_ROWS = int(os.environ.get('SALES_DASHBOARD_STREAM_CHUNK_ROWS', '1000000'))
+
+# Общий набор данных в отображаемых в память файлах для всех процессов и сессий (shared_store.py)
+SHARED_DATASET = _env_flag('SALES_DASHBOARD_SHARED_DATASET', False)
+SHARED_DIR = os.environ.get('SALES_DASHBOARD_SHARED_DIR', os.path.join(CACHE_DIR, 'shared'))
+
+# Фоновая перезагрузка данных при изменении книг (watcher.py) и период проверки в секундах
+WATCH_DATA = _env_flag('SALES_DASHBOARD_WATCH_DATA', False)
+WATCH_INTERVAL = float(os.environ.get('SALES_DASHBOARD_WATCH_INTERVAL', '5'))
+# Сколько секунд сессия ждёт первую загрузку данных фоновым потоком
+WATCH_TIMEOUT = float(os.environ.get('SALES_DASHBOARD_WATCH_TIMEOUT', '300'))
+
+# Движок запросов анализа: pandas (модель в памяти) или duckdb (SQL по Parquet-кэшу, sql_backend.py)
+BACKEND = os.environ.get('SALES_DASHBOARD_BACKEND', 'pandas')
+# Число потоков DuckDB (0 - по числу ядер)
+SQL_THREADS = int(os.environ.get('SALES_DASHBOARD_SQL_THREADS', '0'))
+
+# Вывод в браузер: строк на странице таблицы (0 - без страниц), точек на графике (0 - без ограничения)
+# и число точек, начиная с которого графики рисуются через WebGL (downsample.py)
+TABLE_PAGE_ROWS = int(os.environ.get('SALES_DASHBOARD_TABLE_PAGE_ROWS', '100'))
+CHART_MAX_POINTS = int(os.environ.get('SALES_DASHBOARD_CHART_MAX_POINTS', '5000'))
+WEBGL_MIN_POINTS = int(os.environ.get('SALES_DASHBOARD_WEBGL_MIN_POINTS', '1000'))
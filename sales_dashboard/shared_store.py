@@ -0,0 +1,201 @@
+# shared_store.py
+"""Общий для всех процессов набор данных в отображаемых в память файлах.
+
+Готовая модель (столбцы таблицы фактов, куба, свёрток по периодам и
+индекса строк) один раз сохраняется в папку версии данных как файлы .npy,
+небольшие таблицы измерений и план - как pickle. Остальные процессы и сессии открывают
+столбцы через np.load(mmap_mode='r'): данные не копируются и не
+разбираются заново, страницы файлов общие для всех процессов в кэше ОС,
+а массивы доступны только для чтения.
+
+Папка версии публикуется атомарно (запись во временную папку и
+переименование), поэтому процесс никогда не увидит её недописанной.
+
+Публикация при деплое:
+    python shared_store.py [--data-dir DIR] [--store-dir DIR]
+"""
+import argparse
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+
+import settings
+from data_loader import load_data, sources_version
+from rollups import TimeRollups, rollup_dimensions
+from row_index import RowIndex
+from star_schema import StarSchema
+
+logger = logging.getLogger(__name__)
+
+# Увеличивается при изменении формата файлов
+SHARED_FORMAT_VERSION = 4
+MANIFEST_NAME = 'manifest.json'
+
+
+def _save_schema(directory, schema):
+    """Сохраняет столбцы и индекс строк схемы; возвращает описание для манифеста"""
+    os.makedirs(directory)
+    for column, values in schema.fact.items():
+        if values.dtype.hasobject:
+            raise TypeError(f"Столбец '{column}' нельзя отобразить в память: тип {values.dtype}")
+        np.save(os.path.join(directory, f'{column}.npy'), np.ascontiguousarray(values), allow_pickle=False)
+    index = {}
+    if schema.row_index is not None:
+        for name, postings in schema.row_index.postings.items():
+            values = list(postings)
+            bounds = np.cumsum([0] + [len(postings[v]) for v in values])
+            rows = np.concatenate([postings[v] for v in values]) if values else np.empty(0, dtype=np.int32)
+            np.save(os.path.join(directory, f'index.{name}.npy'), rows.astype(np.int32), allow_pickle=False)
+            index[name] = (values, bounds.tolist())
+        with open(os.path.join(directory, 'index.pkl'), 'wb') as f:
+            pickle.dump(index, f)
+    return {'columns': list(schema.fact), 'aggregated': schema.aggregated, 'indexed': schema.row_index is not None}
+
+
+def _open_schema(directory, meta, dimensions):
+    fact = {
+        column: np.load(os.path.join(directory, f'{column}.npy'), mmap_mode='r')
+        for column in meta['columns']
+    }
+    schema = StarSchema(fact, dimensions, aggregated=meta['aggregated'])
+    if meta['indexed']:
+        with open(os.path.join(directory, 'index.pkl'), 'rb') as f:
+            index = pickle.load(f)
+        postings = {}
+        for name, (values, bounds) in index.items():
+            rows = np.load(os.path.join(directory, f'index.{name}.npy'), mmap_mode='r')
+            # Срезы отображения - тоже отображения, без копирования
+            postings[name] = {value: rows[bounds[i]:bounds[i + 1]] for i, value in enumerate(values)}
+        schema.row_index = RowIndex(postings, len(schema))
+    return schema
+
+
+def _store_dir(store_dir):
+    return store_dir or settings.SHARED_DIR
+
+
+def publish(model, plan, store_dir=None, keep=2):
+    """Сохраняет модель в папку её версии (если такой ещё нет). Возвращает путь к папке."""
+    store_dir = _store_dir(store_dir)
+    target = os.path.join(store_dir, model.version)
+    if os.path.exists(os.path.join(target, MANIFEST_NAME)):
+        return target
+    os.makedirs(store_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=store_dir)
+    try:
+        manifest = {
+            'format': SHARED_FORMAT_VERSION,
+            'version': model.version,
+            'fact': _save_schema(os.path.join(tmp_dir, 'fact'), model),
+            'cube': _save_schema(os.path.join(tmp_dir, 'cube'), model.cube) if model.cube is not None else None,
+            'rollups': {
+                kind: {
+                    level: _save_schema(os.path.join(tmp_dir, f'rollup_{kind}_{level}'), rollup)
+                    for level, rollup in getattr(model.rollups, kind).items()
+                }
+                for kind in ['levels', 'compact']
+            } if model.rollups is not None else None,
+            'load_stats': model.load_stats,
+        }
+        tables = {'dimensions': model.dimensions, 'plan': plan}
+        if model.rollups is not None:
+            tables['rollups'] = {
+                'periods': model.rollups.periods,
+                'plan_monthly': model.rollups.plan_monthly,
+            }
+        with open(os.path.join(tmp_dir, 'tables.pkl'), 'wb') as f:
+            pickle.dump(tables, f)
+        # Манифест пишется последним: по нему проверяется, что папка дописана
+        with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, default=str)
+        try:
+            os.rename(tmp_dir, target)
+        except OSError:
+            # Ту же версию уже опубликовал другой процесс
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    logger.info('Опубликован общий набор данных %s', target)
+    prune(store_dir, keep=keep, current=model.version)
+    return target
+
+
+def attach(version, store_dir=None):
+    """Открывает опубликованную версию только для чтения. Возвращает (StarSchema, plan) или None."""
+    directory = os.path.join(_store_dir(store_dir), version)
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if manifest.get('format') != SHARED_FORMAT_VERSION:
+        return None
+    with open(os.path.join(directory, 'tables.pkl'), 'rb') as f:
+        tables = pickle.load(f)
+    model = _open_schema(os.path.join(directory, 'fact'), manifest['fact'], tables['dimensions'])
+    if manifest['cube'] is not None:
+        model.cube = _open_schema(os.path.join(directory, 'cube'), manifest['cube'], tables['dimensions'])
+    if manifest['rollups'] is not None:
+        rollups = tables['rollups']
+        # Измерения свёрток: вместо клиентов - страны, по дням вместо товаров - категории
+        dimensions = {level: rollup_dimensions(tables['dimensions'], level) for level in rollups['periods']}
+        kinds = {
+            kind: {
+                level: _open_schema(os.path.join(directory, f'rollup_{kind}_{level}'), meta, dimensions[level])
+                for level, meta in levels.items()
+            }
+            for kind, levels in manifest['rollups'].items()
+        }
+        model.rollups = TimeRollups(kinds['levels'], kinds['compact'], rollups['periods'], rollups['plan_monthly'],
+                                    model)
+    model.version = manifest['version']
+    model.load_stats = dict(manifest['load_stats'], shared_dir=directory)
+    return model, tables['plan']
+
+
+def prune(store_dir=None, keep=2, current=None):
+    """Удаляет старые версии, кроме current и keep последних.
+
+    Процессы, уже открывшие удалённую версию, продолжают работать:
+    отображённые файлы остаются доступны до закрытия.
+    """
+    store_dir = _store_dir(store_dir)
+    versions = [
+        entry for entry in os.scandir(store_dir)
+        if entry.is_dir() and not entry.name.startswith('.') and entry.name != current
+    ]
+    versions.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in versions[max(keep - 1, 0):]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def load_shared(data_dir=None, store_dir=None):
+    """Модель и план из общего набора; при отсутствии текущей версии она строится и публикуется"""
+    attached = attach(sources_version(data_dir), store_dir)
+    if attached is not None:
+        return attached
+    model, plan = load_data(data_dir)
+    publish(model, plan, store_dir)
+    # Публикующий процесс тоже работает с отображением, а не со своей копией
+    return attach(model.version, store_dir) or (model, plan)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Публикация общего набора данных для процессов дашборда')
+    parser.add_argument('--data-dir', default=settings.DATA_DIR, help='Папка с Excel-файлами')
+    parser.add_argument('--store-dir', default=settings.SHARED_DIR, help='Папка общего набора')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    model, _ = load_shared(args.data_dir, args.store_dir)
+    print(f"Общий набор: {model.load_stats['shared_dir']} ({len(model)} строк)")
+
+
+if __name__ == '__main__':
+    main()
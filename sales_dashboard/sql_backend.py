@@ -0,0 +1,222 @@
+# sql_backend.py
+"""Выполнение запросов анализа встроенной колоночной SQL-СУБД (DuckDB).
+
+Данные не загружаются в pandas: DuckDB читает Parquet-файлы колоночного
+кэша (или синтетического набора) напрямую, в несколько потоков. Таблица
+фактов соединяется с измерениями в представлении facts со столбцами
+широкой таблицы (год, страна, категория, менеджер, прибыль и т.д.).
+Фильтры боковой панели и условия where передаются в SQL как предикаты,
+поэтому DuckDB проталкивает их к чтению файлов и соединениям.
+
+DuckDBSource поддерживает тот же метод aggregate(), что и FactView, и
+возвращает те же таблицы: атрибуты измерений приводятся к тем же
+категориальным типам, строки упорядочиваются по ключам группировки.
+Режим включается настройкой SALES_DASHBOARD_BACKEND=duckdb.
+"""
+import importlib.util
+import os
+import threading
+
+import pandas as pd
+
+import settings
+from data_loader import read_parquet_dimensions, read_parquet_plan
+from schema import WEEKDAY_ORDER
+from star_schema import DIMENSION_ATTRIBUTES, FILTER_ATTRIBUTES
+
+DUCKDB_AVAILABLE = importlib.util.find_spec('duckdb') is not None
+
+FACTS_VIEW = """
+CREATE OR REPLACE VIEW facts AS
+WITH f AS (
+    SELECT * REPLACE (CAST(orderdate AS TIMESTAMP) AS orderdate)
+    FROM read_parquet({fact}, file_row_number = true)
+)
+SELECT
+    f.file_row_number AS row_number,
+    f.orderdate, f.orderid,
+    p.name, p.city, p.country,
+    pr.productid, pr.productname, pr.categoryid, pr.categoryname,
+    s.employeeid AS employee_id, s.employeename,
+    c.day,
+    f.grosssalesamount, f.netsalesamount, f.discount, f.quantity, f.actualunitprice, f.supplierprice,
+    year(f.orderdate) AS year,
+    month(f.orderdate) AS month,
+    dayname(f.orderdate) AS day_of_week,
+    f.netsalesamount - f.supplierprice AS profit
+FROM f
+LEFT JOIN read_parquet({partner}) p ON f.name = p.name
+LEFT JOIN read_parquet({products}) pr ON f.productid = pr.productid
+LEFT JOIN read_parquet({staff}) s ON f.employee_id = s.employeeid
+LEFT JOIN (SELECT CAST(orderdate AS TIMESTAMP) AS orderdate, day FROM read_parquet({calendar})) c
+    ON f.orderdate = c.orderdate
+"""
+
+
+def _literal(path):
+    return "'" + path.replace("'", "''") + "'"
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _python(value):
+    """Значение параметра запроса (numpy-скаляры - в обычные типы Python)"""
+    return value.item() if hasattr(value, 'item') else value
+
+
+def _as_list(values):
+    return list(values) if isinstance(values, (list, tuple, set)) else [values]
+
+
+class DuckDBSource:
+    """Факты и измерения в Parquet, запросы к которым выполняет DuckDB"""
+
+    def __init__(self, directory=None, selection=None, threads=None, _shared=None):
+        import duckdb
+
+        self.directory = directory or settings.CACHE_DIR
+        self.selection = {name: values for name, values in (selection or {}).items() if values}
+        self.version = None
+        self.load_stats = {}
+        if _shared is None:
+            connection = duckdb.connect()
+            threads = settings.SQL_THREADS if threads is None else threads
+            if threads > 0:
+                connection.execute(f'SET threads = {int(threads)}')
+            paths = {name: _literal(os.path.join(self.directory, f'{name}.parquet'))
+                     for name in ['fact', 'partner', 'products', 'staff', 'calendar']}
+            connection.execute(FACTS_VIEW.format(**paths))
+            _shared = {
+                'connection': connection,
+                'lock': threading.Lock(),
+                # Измерения нужны только для категориальных типов результата
+                'dimensions': read_parquet_dimensions(self.directory),
+                'types': dict(connection.execute('SELECT column_name, column_type FROM (DESCRIBE facts)').fetchall()),
+            }
+        self._shared = _shared
+        self._n_rows = None
+
+    def read_plan(self):
+        return read_parquet_plan(self.directory)
+
+    def select(self, years=None, countries=None, categories=None, managers=None):
+        """Тот же источник с фильтрами боковой панели (соединение с DuckDB общее)"""
+        selection = {'years': years, 'countries': countries, 'categories': categories, 'managers': managers}
+        source = DuckDBSource(self.directory, selection, _shared=self._shared)
+        source.version, source.load_stats = self.version, self.load_stats
+        return source
+
+    def _conditions(self, where=None):
+        """Предикаты SQL и их параметры: фильтры боковой панели и условия where"""
+        clauses, params = [], []
+        for parameter, values in self.selection.items():
+            values = [_python(v) for v in _as_list(values)]
+            if parameter == 'years':
+                # Диапазоны дат, а не year(...): их можно проверить по статистике блоков Parquet
+                clauses.append('(' + ' OR '.join(
+                    'orderdate >= make_timestamp(?, 1, 1, 0, 0, 0) AND orderdate < make_timestamp(?, 1, 1, 0, 0, 0)'
+                    for _ in values) + ')')
+                for year in values:
+                    params += [int(year), int(year) + 1]
+            else:
+                clauses.append(f'{_quote(FILTER_ATTRIBUTES[parameter])} IN ({", ".join("?" * len(values))})')
+                params += values
+        for column, values in (where or {}).items():
+            values = [_python(v) for v in _as_list(values)]
+            clauses.append(f'{_quote(column)} IN ({", ".join("?" * len(values))})')
+            params += values
+        return clauses, params
+
+    def query(self, sql, params=()):
+        """Результат запроса как DataFrame (отдельный курсор: запросы из разных сессий не мешают друг другу)"""
+        with self._shared['lock']:
+            cursor = self._shared['connection'].cursor()
+        try:
+            return cursor.execute(sql, list(params)).df()
+        finally:
+            cursor.close()
+
+    def _restore_types(self, frame, columns):
+        """Категориальные типы атрибутов columns, как у звёздной схемы"""
+        for column in columns:
+            if column == 'day_of_week':
+                frame[column] = pd.Categorical(frame[column], categories=WEEKDAY_ORDER, ordered=True)
+            elif column in DIMENSION_ATTRIBUTES:
+                dimension, attribute = DIMENSION_ATTRIBUTES[column]
+                dtype = self._shared['dimensions'][dimension][attribute].dtype
+                if isinstance(dtype, pd.CategoricalDtype):
+                    frame[column] = pd.Categorical(frame[column], dtype=dtype)
+        return frame
+
+    def _is_integer(self, column):
+        return self._shared['types'].get(column, '').upper() in (
+            'TINYINT', 'SMALLINT', 'INTEGER', 'BIGINT', 'HUGEINT', 'UTINYINT', 'USMALLINT', 'UINTEGER', 'UBIGINT')
+
+    def aggregate(self, by, measures, where=None, keep_counts=False):
+        """Группировка с агрегатами {столбец: 'sum' | 'mean' | 'nunique'} (см. aggregate_frame)"""
+        by = list(by)
+        expressions = [_quote(column) for column in by]
+        for column, func in measures.items():
+            quoted = _quote(column)
+            if func == 'sum':
+                expression = f'SUM({quoted})'
+                if self._is_integer(column):
+                    expression = f'CAST({expression} AS BIGINT)'
+                if not by:
+                    # Сумма по пустому набору строк - 0, как в pandas
+                    expression = f'COALESCE({expression}, 0)'
+                expressions.append(f'{expression} AS {quoted}')
+            elif func == 'mean' and keep_counts:
+                expressions.append(f'SUM({quoted}) AS {quoted}')
+                expressions.append(f'COUNT({quoted}) AS {_quote(column + "_count")}')
+            elif func == 'mean':
+                expressions.append(f'AVG({quoted}) AS {quoted}')
+            elif func == 'nunique':
+                expressions.append(f'COUNT(DISTINCT {quoted}) AS {quoted}')
+            else:
+                raise ValueError(f"Неизвестная агрегатная функция '{func}'")
+
+        clauses, params = self._conditions(where)
+        # Как aggregate_frame: строки с пропуском в ключе группировки не попадают в результат,
+        # кроме частичных итогов для дальнейшей агрегации (keep_counts)
+        if not keep_counts:
+            clauses += [f'{_quote(column)} IS NOT NULL' for column in by]
+        sql = f'SELECT {", ".join(expressions)} FROM facts'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        if by:
+            sql += ' GROUP BY ' + ', '.join(_quote(column) for column in by)
+        result = self._restore_types(self.query(sql, params), by)
+        if by:
+            result = result.sort_values(by, ignore_index=True)
+        return result
+
+    def column(self, name):
+        """Столбец отобранных строк в порядке таблицы фактов"""
+        clauses, params = self._conditions()
+        sql = f'SELECT {_quote(name)} FROM facts'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        frame = self._restore_types(self.query(sql + ' ORDER BY row_number', params), [name])
+        return frame[name]
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    def unique_values(self, name):
+        """Отсортированные значения атрибута среди отобранных строк"""
+        values = self.aggregate([name], {})[name]
+        return sorted(values.dropna().unique())
+
+    def __len__(self):
+        if self._n_rows is None:
+            clauses, params = self._conditions()
+            sql = 'SELECT COUNT(*) AS n FROM facts' + (' WHERE ' + ' AND '.join(clauses) if clauses else '')
+            self._n_rows = int(self.query(sql, params)['n'].iloc[0])
+        return self._n_rows
+
+    @property
+    def empty(self):
+        return len(self) == 0
@@ -0,0 +1,402 @@
+# star_schema.py
+"""Звёздная схема данных продаж.
+
+Вместо широкой таблицы из четырёх объединений хранится узкая таблица фактов
+с целочисленными суррогатными ключами (customer_key, product_key, employee_key,
+date_key) и небольшие таблицы измерений. Атрибуты измерений (страна, категория,
+менеджер и т.д.) подставляются по запросу через np.take по ключам, поэтому
+таблица фактов ни разу не копируется целиком.
+"""
+import numpy as np
+import pandas as pd
+
+from row_index import RowIndex
+from schema import DIMENSION_COLUMNS, WEEKDAY_ORDER, downcast_numeric
+
+# Измерение -> (столбец-ключ в исходной таблице фактов, ключ измерения, суррогатный ключ)
+DIMENSION_KEYS = {
+    'customer': ('name', 'name', 'customer_key'),
+    'product': ('productid', 'productid', 'product_key'),
+    'employee': ('employee_id', 'employeeid', 'employee_key'),
+    'calendar': ('orderdate', 'orderdate', 'date_key'),
+}
+
+# Атрибут -> (измерение, столбец измерения)
+DIMENSION_ATTRIBUTES = {
+    'name': ('customer', 'name'),
+    'city': ('customer', 'city'),
+    'country': ('customer', 'country'),
+    'productid': ('product', 'productid'),
+    'productname': ('product', 'productname'),
+    'categoryid': ('product', 'categoryid'),
+    'categoryname': ('product', 'categoryname'),
+    'employee_id': ('employee', 'employeeid'),
+    'employeename': ('employee', 'employeename'),
+    'day': ('calendar', 'day'),
+}
+
+# Столбцы исходной таблицы фактов, из которых строятся столбцы звёздной схемы
+FACT_SOURCE_COLUMNS = [
+    'orderdate', 'orderid', 'name', 'productid', 'employee_id', 'grosssalesamount',
+    'netsalesamount', 'discount', 'quantity', 'actualunitprice', 'supplierprice',
+]
+
+# Порядок столбцов широкой таблицы (как после объединений исходных таблиц)
+WIDE_COLUMNS = [
+    'orderdate', 'orderid', 'name', 'productid', 'grosssalesamount', 'netsalesamount',
+    'discount', 'quantity', 'actualunitprice', 'supplierprice', 'employee_id',
+    'year', 'month', 'day_of_week', 'profit', 'city', 'country', 'productname',
+    'categoryid', 'categoryname', 'employeename', 'day',
+]
+
+# Фильтры боковой панели: параметр select() -> атрибут
+FILTER_ATTRIBUTES = {
+    'years': 'year',
+    'countries': 'country',
+    'categories': 'categoryname',
+    'managers': 'employeename',
+}
+
+
+def _take(values, keys):
+    """np.take с поддержкой ключа -1 (нет строки в измерении)"""
+    missing = keys < 0
+    if not missing.any():
+        return np.take(values, keys)
+    result = np.take(values, keys, mode='clip')
+    if result.dtype.kind in 'iub':
+        result = result.astype(np.float64)
+    result[missing] = np.nan if result.dtype.kind in 'fc' else None
+    return result
+
+
+def _as_list(values):
+    if isinstance(values, (list, tuple, set, np.ndarray, pd.Index, pd.Series)):
+        return list(values)
+    return [values]
+
+
+def aggregate_frame(frame, by, measures, aggregated=False, keep_counts=False):
+    """Группирует frame по столбцам by и считает measures {столбец: 'sum' | 'mean' | 'nunique'}.
+
+    Для предагрегированных ячеек (aggregated=True) среднее считается как
+    сумма столбца, делённая на сумму столбца '<столбец>_count'. При keep_counts=True
+    среднее не делится: возвращаются сумма и '<столбец>_count', чтобы результат
+    можно было агрегировать дальше; по той же причине группы с пропуском в
+    ключах by (например, клиент, которого нет в измерении) тогда сохраняются,
+    иначе отбрасываются, как в groupby. При пустом by возвращается одна строка с итогами.
+    """
+    spec = []
+    for column, func in measures.items():
+        if func != 'mean' or (not aggregated and not keep_counts):
+            spec.append((column, column, func))
+        elif aggregated:
+            spec += [(column, column, 'sum'), (f'{column}_count', f'{column}_count', 'sum')]
+        else:
+            spec += [(column, column, 'sum'), (f'{column}_count', column, 'count')]
+    if by:
+        result = frame.groupby(by, observed=True, dropna=not keep_counts).agg(
+            **{name: (source, func) for name, source, func in spec}
+        ).reset_index()
+    else:
+        result = pd.DataFrame({name: [getattr(frame[source], func)()] for name, source, func in spec})
+    if aggregated and not keep_counts:
+        for column, func in measures.items():
+            if func == 'mean':
+                result[column] = result[column] / result.pop(f'{column}_count')
+    return result
+
+
+def _compact_dimension(table):
+    return table.assign(**{
+        column: table[column].astype('category') if column in DIMENSION_COLUMNS
+        else downcast_numeric(table[column])
+        for column in table.columns
+    })
+
+
+class StarSchema:
+    """Узкая таблица фактов (словарь столбец -> массив) и таблицы измерений"""
+
+    def __init__(self, fact, dimensions, aggregated=False):
+        self.fact = fact
+        self.dimensions = dimensions
+        # aggregated=True - строки являются ячейками куба (см. cube.py)
+        self.aggregated = aggregated
+        self.n_rows = len(next(iter(fact.values()))) if fact else 0
+        self.row_index = None
+        self.cube = None
+        # Свёртки по дням, месяцам и годам календаря (см. rollups.py)
+        self.rollups = None
+        # Версия исходных данных (для ключей кэша результатов) и замеры загрузки
+        self.version = None
+        self.load_stats = {}
+
+    def __len__(self):
+        return self.n_rows
+
+    @property
+    def empty(self):
+        return self.n_rows == 0
+
+    @property
+    def columns(self):
+        return [c for c in WIDE_COLUMNS if self.has_column(c)]
+
+    def has_column(self, name):
+        if name in self.fact:
+            return True
+        if name == 'day_of_week':
+            return 'weekday' in self.fact
+        if name in DIMENSION_ATTRIBUTES:
+            return DIMENSION_KEYS[DIMENSION_ATTRIBUTES[name][0]][2] in self.fact
+        return False
+
+    def column_values(self, name, rows=None):
+        """Массив значений столбца (для атрибутов - Categorical или ndarray)"""
+        if name == 'day_of_week':
+            codes = self._fact_array('weekday', rows)
+            return pd.Categorical.from_codes(codes, categories=WEEKDAY_ORDER, ordered=True)
+        if name in self.fact:
+            return self._fact_array(name, rows)
+        dimension, attribute = DIMENSION_ATTRIBUTES[name]
+        keys = self._fact_array(DIMENSION_KEYS[dimension][2], rows)
+        values = self.dimensions[dimension][attribute]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Ключ -1 попадает на добавленный в конец код -1 (пропуск)
+            codes = np.take(np.append(values.cat.codes.to_numpy(), -1), keys)
+            return pd.Categorical.from_codes(codes, dtype=values.dtype)
+        return _take(values.to_numpy(), keys)
+
+    def column(self, name, rows=None):
+        return pd.Series(self.column_values(name, rows), name=name)
+
+    def _fact_array(self, name, rows):
+        values = self.fact[name]
+        return values if rows is None else np.take(values, rows)
+
+    def frame(self, columns=None, rows=None):
+        """DataFrame только с нужными столбцами (по умолчанию - все широкие столбцы)"""
+        columns = self.columns if columns is None else columns
+        return pd.DataFrame({c: self.column_values(c, rows) for c in columns})
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    def to_frame(self):
+        """Широкая таблица, эквивалентная прежней цепочке объединений"""
+        return self.frame()
+
+    def filter_mask(self, name, values, rows=None):
+        """Булева маска строк (из rows или всех), где атрибут name входит в values.
+
+        Для атрибутов измерений проверка выполняется по строкам измерения, а затем
+        переносится на факты по ключу.
+        """
+        values = _as_list(values)
+        if name in self.fact:
+            return np.isin(self._fact_array(name, rows), values)
+        if name == 'day_of_week':
+            codes = [WEEKDAY_ORDER.index(v) for v in values if v in WEEKDAY_ORDER]
+            return np.isin(self._fact_array('weekday', rows), codes)
+        dimension, attribute = DIMENSION_ATTRIBUTES[name]
+        matches = self.dimensions[dimension][attribute].isin(values).to_numpy()
+        # Ключ -1 попадает на добавленный в конец False
+        return np.take(np.append(matches, False), self._fact_array(DIMENSION_KEYS[dimension][2], rows))
+
+    def aggregate(self, by, measures, where=None, keep_counts=False):
+        """Группировка по всем строкам (см. FactView.aggregate)"""
+        return self.select().aggregate(by, measures, where, keep_counts)
+
+    def aggregate_rows(self, by, measures, where=None, rows=None, keep_counts=False):
+        """Группировка строк rows с условиями равенства where {атрибут: значение или список}"""
+        for name, values in (where or {}).items():
+            mask = self.filter_mask(name, values, rows)
+            rows = np.flatnonzero(mask) if rows is None else rows[mask]
+        columns = list(by) + list(measures)
+        if self.aggregated:
+            columns += [f'{column}_count' for column, func in measures.items() if func == 'mean']
+        frame = self.frame(list(dict.fromkeys(columns)), rows)
+        return aggregate_frame(frame, list(by), measures, aggregated=self.aggregated, keep_counts=keep_counts)
+
+    def append(self, other):
+        """Новая схема: строки этой схемы, за которыми идут строки other (с теми же измерениями).
+
+        Исходные массивы не меняются. Индекс строк не перестраивается, а дополняется
+        индексом новых строк.
+        """
+        fact = {column: np.concatenate([values, other.fact[column]]) for column, values in self.fact.items()}
+        combined = StarSchema(fact, self.dimensions, aggregated=self.aggregated)
+        if self.row_index is not None:
+            delta_index = other.row_index or RowIndex.build(other, self.row_index.postings)
+            combined.row_index = self.row_index.extend(delta_index, offset=self.n_rows)
+        return combined
+
+    def build_row_index(self):
+        """Строит инвертированный индекс по атрибутам фильтров боковой панели"""
+        self.row_index = RowIndex.build(self, FILTER_ATTRIBUTES.values())
+        return self.row_index
+
+    def select(self, years=None, countries=None, categories=None, managers=None):
+        """Представление строк, удовлетворяющих фильтрам боковой панели (пустой фильтр - без ограничений).
+
+        Строки находятся по инвертированному индексу: объединение по значениям
+        одного фильтра и пересечение между фильтрами.
+        """
+        row_index = self.row_index or self.build_row_index()
+        selection = {'years': years, 'countries': countries, 'categories': categories, 'managers': managers}
+        rows = row_index.select({
+            FILTER_ATTRIBUTES[parameter]: values for parameter, values in selection.items()
+        })
+        return FactView(self, rows, selection)
+
+    def unique_values(self, name):
+        """Отсортированные значения атрибута, встречающиеся в фактах"""
+        if name in DIMENSION_ATTRIBUTES:
+            dimension, attribute = DIMENSION_ATTRIBUTES[name]
+            keys = np.unique(self.fact[DIMENSION_KEYS[dimension][2]])
+            values = self.dimensions[dimension][attribute].take(keys[keys >= 0])
+        else:
+            values = self.column(name)
+        return sorted(values.dropna().unique())
+
+    def distinct_estimate(self, name):
+        """Оценка числа различных значений атрибута без прохода по фактам (сверху)"""
+        if name == 'day_of_week':
+            return len(WEEKDAY_ORDER)
+        if name == 'month':
+            return 12
+        if name == 'year':
+            return self.dimensions['calendar']['orderdate'].dt.year.nunique()
+        if name in DIMENSION_ATTRIBUTES:
+            dimension, attribute = DIMENSION_ATTRIBUTES[name]
+            return self.dimensions[dimension][attribute].nunique()
+        # Меры и прочие столбцы фактов: возможно, своё значение у каждой строки
+        return self.n_rows
+
+    def memory_usage(self):
+        fact_bytes = sum(values.nbytes for values in self.fact.values())
+        dimension_bytes = sum(int(d.memory_usage(deep=True).sum()) for d in self.dimensions.values())
+        return {
+            'rows': self.n_rows,
+            'fact_bytes': fact_bytes,
+            'dimension_bytes': dimension_bytes,
+            'bytes_per_row': (fact_bytes + dimension_bytes) / self.n_rows if self.n_rows else 0.0,
+        }
+
+    def wide_bytes_per_row(self, sample_rows=10000):
+        """Оценка байт на строку той же таблицы в широком виде (как после объединений:
+        строки - объекты Python, числа - 64 бита) по равномерной выборке строк"""
+        if not self.n_rows:
+            return 0.0
+        rows = np.linspace(0, self.n_rows - 1, min(sample_rows, self.n_rows)).astype(np.int64)
+        wide = {}
+        for column, values in self.frame(rows=rows).items():
+            kind = values.dtype.kind
+            if kind in 'iu':
+                wide[column] = values.astype(np.int64)
+            elif kind == 'f':
+                wide[column] = values.astype(np.float64)
+            else:
+                wide[column] = values if kind == 'M' else values.astype(object)
+        return float(pd.DataFrame(wide).memory_usage(deep=True, index=False).sum()) / len(rows)
+
+
+class FactView:
+    """Подмножество строк звёздной схемы без копирования таблицы фактов"""
+
+    def __init__(self, schema, rows=None, selection=None):
+        self.schema = schema
+        self.rows = rows
+        # Фильтры боковой панели, по которым получены rows (нужны для запроса к кубу)
+        self.selection = selection if selection is not None else ({} if rows is None else None)
+
+    def __len__(self):
+        return len(self.schema) if self.rows is None else len(self.rows)
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    @property
+    def columns(self):
+        return self.schema.columns
+
+    def column(self, name):
+        return self.schema.column(name, self.rows)
+
+    def frame(self, columns=None):
+        return self.schema.frame(columns, self.rows)
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    def to_frame(self):
+        return self.frame()
+
+    def distinct_estimate(self, name):
+        return min(self.schema.distinct_estimate(name), len(self))
+
+    def aggregate(self, by, measures, where=None, keep_counts=False):
+        """Группировка с агрегатами {столбец: 'sum' | 'mean' | 'nunique'} (см. aggregate_frame).
+
+        Если все нужные столбцы есть в кубе, ответ собирается из его ячеек
+        с теми же фильтрами, иначе - из строк фактов.
+        """
+        cube = self.schema.cube
+        columns = list(by) + list(measures) + list(where or {})
+        if cube is not None and self.selection is not None and all(cube.has_column(c) for c in columns):
+            return cube.select(**self.selection).aggregate(by, measures, where, keep_counts)
+        return self.schema.aggregate_rows(by, measures, where, self.rows, keep_counts)
+
+
+def enrich_facts(fact, dimensions):
+    """Столбцы таблицы фактов для исходных строк fact по готовым таблицам измерений.
+
+    Подставляются суррогатные ключи (ключ -1 - строки нет в измерении)
+    и производные поля. Используется и при полной сборке, и при дозагрузке
+    новых строк продаж (ingest.py).
+    """
+    columns = {
+        'orderdate': fact['orderdate'].to_numpy(),
+        'orderid': downcast_numeric(fact['orderid']).to_numpy(),
+    }
+    for dimension, (fact_key, dimension_key, surrogate_key) in DIMENSION_KEYS.items():
+        keys = pd.Index(dimensions[dimension][dimension_key]).get_indexer(fact[fact_key])
+        columns[surrogate_key] = downcast_numeric(pd.Series(keys)).to_numpy()
+
+    for measure in ['grosssalesamount', 'netsalesamount', 'discount', 'quantity',
+                    'actualunitprice', 'supplierprice']:
+        columns[measure] = downcast_numeric(fact[measure]).to_numpy()
+
+    # Производные поля (день недели хранится кодом 0-6 в порядке WEEKDAY_ORDER)
+    orderdate = fact['orderdate'].dt
+    columns['year'] = downcast_numeric(orderdate.year).to_numpy()
+    columns['month'] = downcast_numeric(orderdate.month).to_numpy()
+    columns['weekday'] = orderdate.dayofweek.to_numpy().astype(np.int8)
+    columns['profit'] = (fact['netsalesamount'] - fact['supplierprice']).to_numpy()
+    return columns
+
+
+def build_dimensions(partner, products, staff, calendar):
+    """Компактные таблицы измерений звёздной схемы"""
+    dimension_tables = {
+        'customer': partner,
+        'product': products,
+        'employee': staff,
+        'calendar': calendar[['orderdate', 'day']],
+    }
+
+    dimensions = {}
+    for dimension, (_, dimension_key, _) in DIMENSION_KEYS.items():
+        table = dimension_tables[dimension].reset_index(drop=True)
+        if not table[dimension_key].is_unique:
+            raise ValueError(f"Неуникальный ключ '{dimension_key}' в измерении '{dimension}'")
+        dimensions[dimension] = _compact_dimension(table)
+    return dimensions
+
+
+def build_star_schema(fact, partner, products, staff, calendar):
+    """Строит звёздную схему из исходных таблиц без объединений"""
+    dimensions = build_dimensions(partner, products, staff, calendar)
+    return StarSchema(enrich_facts(fact, dimensions), dimensions)
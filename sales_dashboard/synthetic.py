@@ -0,0 +1,177 @@
+# synthetic.py
+"""Генератор синтетических данных продаж для нагрузочных тестов.
+
+Пишет таблицы calendar, partner, plan, staff, products и fact с теми же
+столбцами, что и книги из папки 'Визуализация', в файлы '<имя>.parquet'
+(формат колоночного кэша, см. data_loader.read_parquet_tables). Небольшие
+наборы можно дополнительно записать в .xlsx, чтобы проверить разбор Excel.
+
+Генерация детерминирована по seed; таблица фактов создаётся блоками,
+поэтому объём памяти ограничен размером блока даже для 50 млн строк.
+
+    python synthetic.py OUT_DIR --rows 1000000 [--seed 0] [--excel]
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_loader import SOURCE_FILES
+
+# Excel не вмещает больше 1 048 576 строк на листе
+EXCEL_MAX_ROWS = 1_048_575
+
+MONTH_NAMES = ['янв', 'фев', 'мар', 'апр', 'май', 'июн', 'июл', 'авг', 'сен', 'окт', 'ноя', 'дек']
+
+COUNTRIES = [
+    'Австрия', 'Англия', 'Аргентина', 'Бельгия', 'Бразилия', 'Венесуэла', 'Германия',
+    'Дания', 'Ирландия', 'Испания', 'Италия', 'Канада', 'Мексика', 'Норвегия', 'Польша',
+    'Португалия', 'Россия', 'Финляндия', 'Франция', 'Швейцария', 'Швеция',
+]
+
+# Категории и менеджеры из исходных данных, чтобы вопросы дашборда давали результат
+CATEGORIES = [
+    'Мужская одежда', 'Женская одежда', 'Детская одежда', 'Мужская обувь',
+    'Одежда для новорожденных', 'Пляжная одежда', 'Спортивная одежда', 'Женская обувь',
+]
+EMPLOYEES = [
+    'Григорий Васильев', 'Матвей Крылов', 'Артём Воробьев', 'Вероника Давыдова', 'Георгий Васильев',
+    'Глеб Виноградов', 'Даниил Демин', 'Ева Казакова', 'Кирилл Котов',
+]
+DISCOUNTS = np.array([0.0, 0.0, 0.0, 0.01, 0.02, 0.03, 0.05, 0.1, 0.15, 0.2, 0.25])
+
+
+def dimension_sizes(n_rows):
+    """Размеры измерений, растущие вместе с таблицей фактов"""
+    return {
+        'customers': int(min(max(90, n_rows // 200), 200_000)),
+        'products': int(min(max(77, n_rows // 1_000), 20_000)),
+    }
+
+
+def generate_dimensions(n_rows, seed=0, start='2015-01-01', end='2020-12-31'):
+    """Календарь, контрагенты, товары, сотрудники и план"""
+    rng = np.random.default_rng(seed)
+    sizes = dimension_sizes(n_rows)
+
+    dates = pd.date_range(start, end, freq='D')
+    calendar = pd.DataFrame({
+        'orderdate': dates.strftime('%Y-%m-%d %H:%M:%S'),
+        'day': dates.day,
+        'month': [MONTH_NAMES[m - 1] for m in dates.month],
+        'year': dates.year,
+    })
+
+    n_customers = sizes['customers']
+    partner = pd.DataFrame({
+        'name': [f'Клиент {i:06d}' for i in range(1, n_customers + 1)],
+        'city': [f'Город {i:04d}' for i in rng.integers(1, max(n_customers // 3, 2), n_customers)],
+        'country': rng.choice(COUNTRIES, n_customers),
+    })
+
+    n_products = sizes['products']
+    category_ids = rng.integers(1, len(CATEGORIES) + 1, n_products)
+    products = pd.DataFrame({
+        'productid': np.arange(1, n_products + 1),
+        'productname': [f'Товар {i:05d}' for i in range(1, n_products + 1)],
+        'categoryid': category_ids,
+        'categoryname': [CATEGORIES[c - 1] for c in category_ids],
+    })
+
+    staff = pd.DataFrame({
+        'employeeid': np.arange(1, len(EMPLOYEES) + 1),
+        'employeename': EMPLOYEES,
+    })
+
+    months = pd.date_range(dates[0].to_period('M').to_timestamp(), dates[-1], freq='MS')
+    plan = pd.DataFrame({
+        'Date': np.repeat(months, len(CATEGORIES)),
+        'category_id': np.tile(np.arange(1, len(CATEGORIES) + 1), len(months)),
+    })
+    monthly_rows = max(n_rows / len(months) / len(CATEGORIES), 1)
+    plan['Gross_Plan'] = (rng.uniform(600, 1000, len(plan)) * monthly_rows).round().astype(np.int64)
+    plan['Net_Plan'] = (plan['Gross_Plan'] * rng.uniform(0.15, 0.3, len(plan))).round(1)
+
+    return {'calendar': calendar, 'partner': partner, 'plan': plan, 'staff': staff, 'products': products}
+
+
+def generate_fact_chunk(dimensions, start_row, n_rows, total_rows, seed=0):
+    """Строки фактов [start_row, start_row + n_rows); даты возрастают вместе с номером строки"""
+    rng = np.random.default_rng([seed, start_row])
+    calendar_dates = pd.to_datetime(dimensions['calendar']['orderdate']).to_numpy()
+    positions = (np.arange(start_row, start_row + n_rows) * len(calendar_dates)) // total_rows
+    orderdate = calendar_dates[positions]
+
+    products = dimensions['products']
+    product_index = rng.integers(0, len(products), n_rows)
+    unit_price = 1 + (product_index % 97) * 0.5 + rng.uniform(0, 5, n_rows)
+    quantity = rng.integers(1, 120, n_rows)
+    discount = rng.choice(DISCOUNTS, n_rows)
+    gross = unit_price * quantity
+    net = gross * (1 - discount) * rng.uniform(0.15, 0.3, n_rows)
+    supplier = unit_price * rng.uniform(0.5, 0.95, n_rows)
+
+    return pd.DataFrame({
+        'orderdate': orderdate,
+        'orderid': 10_000 + (start_row + np.arange(n_rows)) // 3,
+        'name': dimensions['partner']['name'].to_numpy()[rng.integers(0, len(dimensions['partner']), n_rows)],
+        'productid': products['productid'].to_numpy()[product_index],
+        'grosssalesamount': gross.round(4),
+        'netsalesamount': net.round(4),
+        'discount': discount,
+        'quantity': quantity,
+        'actualunitprice': (unit_price * (1 - discount)).round(4),
+        'supplierprice': supplier.round(2),
+        'employee_id': rng.integers(1, len(EMPLOYEES) + 1, n_rows),
+    })
+
+
+def write_dataset(out_dir, n_rows, seed=0, chunk_rows=1_000_000, excel=False):
+    """Записывает синтетический набор в out_dir. Возвращает словарь имя -> путь."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(out_dir, exist_ok=True)
+    dimensions = generate_dimensions(n_rows, seed)
+    paths = {}
+    for name, table in dimensions.items():
+        paths[name] = os.path.join(out_dir, f'{name}.parquet')
+        table.to_parquet(paths[name], index=False)
+
+    paths['fact'] = os.path.join(out_dir, 'fact.parquet')
+    writer = None
+    try:
+        for start_row in range(0, n_rows, chunk_rows):
+            chunk = generate_fact_chunk(dimensions, start_row, min(chunk_rows, n_rows - start_row), n_rows, seed)
+            batch = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(paths['fact'], batch.schema)
+            writer.write_table(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if excel:
+        if n_rows > EXCEL_MAX_ROWS:
+            raise ValueError(f'Excel вмещает не больше {EXCEL_MAX_ROWS} строк фактов')
+        tables = dict(dimensions, fact=pd.read_parquet(paths['fact']))
+        for name, filename in SOURCE_FILES.items():
+            tables[name].to_excel(os.path.join(out_dir, filename), index=False)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Генерация синтетических данных продаж')
+    parser.add_argument('out_dir', help='Папка для файлов набора')
+    parser.add_argument('--rows', type=int, default=100_000, help='Число строк фактов')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-rows', type=int, default=1_000_000, help='Размер блока генерации')
+    parser.add_argument('--excel', action='store_true', help='Дополнительно записать книги .xlsx')
+    args = parser.parse_args(argv)
+    write_dataset(args.out_dir, args.rows, seed=args.seed, chunk_rows=args.chunk_rows, excel=args.excel)
+    print(f'Записано {args.rows} строк фактов в {args.out_dir}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# conftest.py
+"""Общие данные тестов: книги из папки 'Визуализация', модель и широкая таблица.
+
+Модули дашборда импортируются без пакета (как при запуске streamlit run),
+поэтому папка приложения добавляется в sys.path.
+"""
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import settings  # noqa: E402
+from data_loader import SOURCE_FILES, build_model, parse_workbooks  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def tables():
+    paths = {name: os.path.join(settings.DATA_DIR, filename) for name, filename in SOURCE_FILES.items()}
+    return parse_workbooks(paths, workers=1)
+
+
+@pytest.fixture(scope='session')
+def model_and_plan(tables):
+    return build_model(tables)
+
+
+def merge_wide(tables):
+    """Широкая таблица продаж, собранная объединениями исходных таблиц (исходная версия дашборда)"""
+    fact = tables['fact'].copy()
+    calendar = tables['calendar'].copy()
+    fact['orderdate'] = pd.to_datetime(fact['orderdate'])
+    calendar['orderdate'] = pd.to_datetime(calendar['orderdate'])
+    fact['year'] = fact['orderdate'].dt.year
+    fact['month'] = fact['orderdate'].dt.month
+    fact['day_of_week'] = fact['orderdate'].dt.day_name()
+    fact['profit'] = fact['netsalesamount'] - fact['supplierprice']
+
+    df = fact.merge(tables['partner'], left_on='name', right_on='name', how='left')
+    df = df.merge(tables['products'], left_on='productid', right_on='productid', how='left')
+    df = df.merge(tables['staff'], left_on='employee_id', right_on='employeeid', how='left')
+    calendar_clean = calendar[['orderdate', 'day', 'month', 'year']]
+    return df.merge(calendar_clean, left_on='orderdate', right_on='orderdate', how='left', suffixes=('', '_cal'))
+
+
+@pytest.fixture(scope='session')
+def wide(tables):
+    return merge_wide(tables)
+
+
+@pytest.fixture(scope='session')
+def plan(tables):
+    plan = tables['plan'].copy()
+    plan['Date'] = pd.to_datetime(plan['Date'])
+    return plan
@@ -0,0 +1,50 @@
+# test_cube.py
+import numpy as np
+import pandas as pd
+
+from cube import CUBE_GRAIN, add_cells, build_cube, cube_cells, update_cube
+from star_schema import StarSchema
+
+
+def rows_of(model, rows):
+    schema = StarSchema({column: values[rows] for column, values in model.fact.items()}, model.dimensions)
+    schema.build_row_index()
+    return schema
+
+
+def sorted_cells(cube):
+    frame = pd.DataFrame(cube.fact)
+    return frame.sort_values(CUBE_GRAIN, ignore_index=True)
+
+
+def test_update_cube_matches_cube_of_all_rows(model_and_plan):
+    model, _ = model_and_plan
+    split = len(model) - 500
+    base, delta = rows_of(model, slice(0, split)), rows_of(model, slice(split, None))
+    cube = build_cube(base)
+    updated = update_cube(cube, delta)
+
+    pd.testing.assert_frame_equal(sorted_cells(updated), sorted_cells(build_cube(rows_of(model, slice(None)))),
+                                  check_dtype=False, rtol=1e-9)
+    # Прежний куб не меняется
+    pd.testing.assert_frame_equal(pd.DataFrame(cube.fact), pd.DataFrame(build_cube(base).fact))
+    # Индекс строк дополнен новыми ячейками
+    assert updated.row_index.n_rows == len(updated)
+    years = updated.select(years=[2016]).aggregate(['year'], {'profit': 'sum'})
+    assert years['year'].tolist() == [2016]
+
+
+def test_add_cells_sums_existing_and_appends_new_cells(model_and_plan):
+    model, _ = model_and_plan
+    cube = build_cube(rows_of(model, slice(0, 1000)))
+    cells = cube_cells(rows_of(model, slice(0, 10)))
+    existing = len(cube)
+    added = add_cells(cube, cells, CUBE_GRAIN)
+    # Все ячейки первых строк уже есть в кубе: число ячеек не меняется, растут только суммы
+    assert len(added) == existing
+    np.testing.assert_allclose(added.fact['profit'].sum(), cube.fact['profit'].sum() + cells['profit'].sum())
+
+    new = cells.assign(year=cells['year'] + 100)
+    extended = add_cells(cube, new, CUBE_GRAIN)
+    assert len(extended) == existing + len(new)
+    np.testing.assert_array_equal(extended.fact['year'][existing:], new['year'].to_numpy())
@@ -0,0 +1,41 @@
+# test_data_cache.py
+import os
+
+import pandas as pd
+import pytest
+
+import data_cache
+import settings
+from data_cache import ColumnarCache, build_cache
+
+
+def test_write_replaces_table_without_leftover_files(tmp_path):
+    source = tmp_path / 'book.xlsx'
+    source.write_bytes(b'workbook')
+    cache = ColumnarCache(str(tmp_path / 'cache'))
+    cache.write('plan', str(source), pd.DataFrame({'value': [1, 2]}))
+    with pytest.raises((TypeError, ValueError)):
+        # Столбец со значениями разных типов Arrow не сохраняет
+        cache.write('plan', str(source), pd.DataFrame({'value': [1, 'a']}))
+    assert sorted(os.listdir(cache.cache_dir)) == ['manifest.json', 'plan.parquet']
+    assert cache.read('plan')['value'].tolist() == [1, 2]
+    assert ColumnarCache(cache.cache_dir).is_fresh('plan', str(source))
+
+
+def test_failed_writes_are_reported_and_not_counted_as_rebuilt(tmp_path, monkeypatch):
+    write = ColumnarCache.write
+
+    def failing_write(self, name, source_path, table):
+        if name == 'plan':
+            raise OSError('No space left on device')
+        write(self, name, source_path, table)
+
+    monkeypatch.setattr(ColumnarCache, 'write', failing_write)
+    cache_dir = str(tmp_path / 'cache')
+    rebuilt, errors = build_cache(settings.DATA_DIR, cache_dir, workers=1)
+    assert list(errors) == ['plan'] and 'No space left on device' in errors['plan']
+    assert 'plan' not in rebuilt and 'fact' in rebuilt
+
+    with pytest.raises(SystemExit) as exited:
+        data_cache.main(['--data-dir', settings.DATA_DIR, '--cache-dir', cache_dir, '--workers', '1'])
+    assert exited.value.code == 1
@@ -0,0 +1,44 @@
+# test_downsample.py
+import numpy as np
+import plotly.graph_objects as go
+
+from downsample import lttb, payload_points, reduce_figure
+
+
+def test_lttb_keeps_endpoints_and_order():
+    x = np.arange(1000, dtype=float)
+    y = np.sin(x / 50)
+    selected = lttb(x, y, 100)
+    assert len(selected) == 100
+    assert selected[0] == 0 and selected[-1] == 999
+    assert np.all(np.diff(selected) > 0)
+
+
+def test_lttb_keeps_peaks():
+    x = np.arange(500, dtype=float)
+    y = np.zeros(500)
+    y[123], y[377] = 10.0, -10.0
+    selected = lttb(x, y, 20)
+    assert 123 in selected and 377 in selected
+
+
+def test_lttb_returns_all_points_when_short():
+    x = np.arange(10, dtype=float)
+    np.testing.assert_array_equal(lttb(x, x, 10), np.arange(10))
+    np.testing.assert_array_equal(lttb(x, x, 2), np.arange(10))
+
+
+def test_reduce_figure_limits_points_and_keeps_input():
+    x = np.arange(20_000)
+    fig = go.Figure([go.Scatter(x=x, y=np.cos(x / 100)), go.Scatter(x=x[:5000], y=x[:5000] * 2.0)])
+    reduced = reduce_figure(fig, max_points=2000, webgl_min_points=500)
+    assert payload_points(reduced) <= 2000
+    assert [trace.type for trace in reduced.data] == ['scattergl', 'scatter']
+    assert payload_points(fig) == 25_000
+
+
+def test_reduce_figure_leaves_small_and_bar_figures():
+    small = go.Figure([go.Scatter(x=[1, 2, 3], y=[3, 1, 2])])
+    assert reduce_figure(small, max_points=100, webgl_min_points=50) is small
+    bars = go.Figure([go.Bar(x=list(range(5000)), y=list(range(5000)))])
+    assert reduce_figure(bars, max_points=100, webgl_min_points=50) is bars
@@ -0,0 +1,184 @@
+# test_equivalence.py
+"""Ответы 11 вопросов по звёздной схеме (строки фактов, куб, общий план
+агрегаций, свёртки), по потоковой обработке и SQL-движку DuckDB над
+Parquet-кэшем совпадают с ответами по широкой таблице из объединений.
+"""
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import analysis
+import settings
+from conftest import merge_wide
+from chunked import ChunkedFactSource
+from cube import build_cube
+from data_cache import build_cache
+from data_loader import build_model
+from planner import AggregationPlanner
+from sql_backend import DUCKDB_AVAILABLE, DuckDBSource
+from star_schema import StarSchema
+
+FILTER_SETS = {
+    'all': {},
+    'years_countries': {'years': [2016, 2017], 'countries': ['Германия', 'Бразилия', 'Россия']},
+    'categories_managers': {'categories': ['Женская обувь', 'Пляжная одежда', 'Одежда для новорожденных'],
+                            'managers': ['Матвей Крылов', 'Ева Казакова']},
+    'one_year': {'years': [2018]},
+}
+# Небольшие блоки, чтобы частичные агрегаты нескольких блоков сливались
+CHUNK_ROWS = 3000
+# Параметр select() -> столбец широкой таблицы
+FILTER_COLUMNS = {'years': 'year', 'countries': 'country', 'categories': 'categoryname', 'managers': 'employeename'}
+
+
+def run_analyses(data, product_name):
+    metrics = analysis.get_key_metrics(data)
+    return {
+        'q1': analysis.get_top_customers_by_category_country(data, 'Женская обувь', 'Германия'),
+        'q2': analysis.pareto_analysis(data, 'Бразилия'),
+        'q3': analysis.get_promising_countries(data),
+        'q4': analysis.get_top_managers_by_sales(data),
+        'q5': analysis.analyze_manager_discounts(data),
+        'q6': analysis.get_productive_weekdays(data, 'Одежда для новорожденных'),
+        'q7': analysis.get_products_by_manager(data, 'Матвей Крылов'),
+        'q8': analysis.get_top_products_by_category(data, 'Пляжная одежда'),
+        'q9': analysis.analyze_product_trend(data, product_name),
+        'q10': analysis.calculate_roi(data),
+        'kpi': pd.DataFrame({key: [float(metrics[key])] for key in ['profit', 'netsalesamount', 'name']}),
+    }
+
+
+def assert_same(result, expected):
+    """Совпадение таблиц с точностью до типов (category и строки, float32 и float64) и порядка сложения"""
+    def normalize(frame):
+        frame = frame.reset_index(drop=True)
+        return frame.astype({
+            column: str for column in frame.columns if isinstance(frame[column].dtype, pd.CategoricalDtype)
+        })
+    pd.testing.assert_frame_equal(normalize(result), normalize(expected), check_dtype=False,
+                                  check_index_type=False, check_column_type=False, rtol=1e-9)
+
+
+@pytest.fixture(scope='module')
+def facts_only(model_and_plan):
+    """Та же модель без куба: ответы считаются по строкам фактов"""
+    model, _ = model_and_plan
+    schema = StarSchema(model.fact, model.dimensions)
+    schema.row_index = model.row_index
+    return schema
+
+
+@pytest.fixture(scope='module')
+def with_cube(facts_only):
+    schema = StarSchema(facts_only.fact, facts_only.dimensions)
+    schema.row_index = facts_only.row_index
+    schema.cube = build_cube(schema)
+    return schema
+
+
+@pytest.fixture(scope='module')
+def parquet_cache(tmp_path_factory):
+    """Колоночный кэш книг (источник для потоковой обработки и DuckDB)"""
+    cache_dir = str(tmp_path_factory.mktemp('cache'))
+    build_cache(settings.DATA_DIR, cache_dir, workers=1)
+    return cache_dir
+
+
+def source_view(request, source, filters):
+    """Строки с фильтрами боковой панели из источника source (для планировщика - с кубом)"""
+    if source == 'chunked':
+        return ChunkedFactSource(request.getfixturevalue('parquet_cache'), CHUNK_ROWS).select(**filters)
+    if source == 'duckdb':
+        if not DUCKDB_AVAILABLE:
+            pytest.skip('пакет duckdb не установлен')
+        return DuckDBSource(request.getfixturevalue('parquet_cache')).select(**filters)
+    return request.getfixturevalue('facts_only' if source == 'facts' else 'with_cube').select(**filters)
+
+
+@pytest.fixture(scope='module')
+def unmatched_tables(tables):
+    """Исходные таблицы и строки продаж без клиента, с товаром и менеджером, которых нет в измерениях"""
+    extra = tables['fact'].tail(30).copy()
+    extra.iloc[:10, extra.columns.get_loc('name')] = None
+    extra.iloc[10:20, extra.columns.get_loc('productid')] = extra['productid'].max() + 1000
+    extra.iloc[20:, extra.columns.get_loc('employee_id')] = extra['employee_id'].max() + 1000
+    return {**tables, 'fact': pd.concat([tables['fact'], extra], ignore_index=True)}
+
+
+def filter_wide(wide, filters):
+    mask = np.ones(len(wide), dtype=bool)
+    for parameter, values in filters.items():
+        mask &= wide[FILTER_COLUMNS[parameter]].isin(values).to_numpy()
+    return wide[mask]
+
+
+@pytest.mark.parametrize('filters', FILTER_SETS.values(), ids=FILTER_SETS.keys())
+@pytest.mark.parametrize('source', ['facts', 'cube', 'planner', 'chunked', 'duckdb'])
+def test_analyses_match_wide_table(request, wide, filters, source):
+    expected_rows = filter_wide(wide, filters)
+    assert len(expected_rows)
+    product_name = expected_rows['productname'].iloc[0]
+    expected = run_analyses(expected_rows, product_name)
+
+    view = source_view(request, source, filters)
+    assert len(view) == len(expected_rows)
+    # Потоковый источник, как и в дашборде, считает все группировки плана за один проход
+    data = AggregationPlanner(view, analysis.ANALYSIS_REQUIREMENTS) if source in ('planner', 'chunked') else view
+    for name, result in run_analyses(data, product_name).items():
+        assert_same(result, expected[name])
+
+
+def test_empty_fact_file_matches_empty_selection(tmp_path, parquet_cache, facts_only):
+    directory = str(tmp_path / 'empty')
+    shutil.copytree(parquet_cache, directory)
+    fact_path = os.path.join(directory, 'fact.parquet')
+    pd.read_parquet(fact_path).iloc[:0].to_parquet(fact_path, index=False)
+
+    source = ChunkedFactSource(directory, CHUNK_ROWS)
+    assert source.empty
+    expected = run_analyses(facts_only.select(years=[1999]), 'Нет товара')
+    for name, result in run_analyses(source, 'Нет товара').items():
+        assert_same(result, expected[name])
+
+
+@pytest.mark.parametrize('filters', FILTER_SETS.values(), ids=FILTER_SETS.keys())
+@pytest.mark.parametrize('source', ['facts', 'planner'])
+def test_unmatched_keys_match_wide_table(unmatched_tables, filters, source):
+    # Строки без клиента, товара или менеджера в измерениях попадают в итоги и
+    # срезы по известным столбцам, но не образуют групп с пропуском
+    expected_rows = filter_wide(merge_wide(unmatched_tables), filters)
+    product_name = expected_rows['productname'].iloc[0]
+    expected = run_analyses(expected_rows, product_name)
+
+    model, _ = build_model(unmatched_tables)
+    view = model.select(**filters)
+    assert len(view) == len(expected_rows)
+    data = AggregationPlanner(view, analysis.ANALYSIS_REQUIREMENTS) if source == 'planner' else view
+    for name, result in run_analyses(data, product_name).items():
+        assert_same(result, expected[name])
+
+
+def test_plan_performance_matches_wide_table(wide, plan, model_and_plan):
+    model, _ = model_and_plan
+    expected = analysis.sales_plan_performance(wide, plan)
+    assert_same(analysis.sales_plan_performance(model, plan), expected)
+    if model.rollups is not None:
+        rollups = model.rollups
+        assert_same(analysis.sales_plan_performance(rollups.select('month'), plan, rollups.plan_monthly), expected)
+
+
+@pytest.mark.parametrize('filters', FILTER_SETS.values(), ids=FILTER_SETS.keys())
+def test_daily_rollups_match_wide_table(wide, model_and_plan, filters):
+    model, _ = model_and_plan
+    if model.rollups is None:
+        pytest.skip('свёртки отключены')
+    # Зерно по дням - категория, а не товар: иначе свёртка не меньше таблицы фактов
+    assert 'day' in model.rollups.compact
+    by = ['orderdate', 'categoryname']
+    result = model.rollups.select('day', **filters).aggregate(by, {'profit': 'sum', 'quantity': 'sum'})
+    expected = filter_wide(wide, filters).groupby(by, observed=True)[['profit', 'quantity']].sum().reset_index()
+    assert_same(result, expected)
+
@@ -0,0 +1,105 @@
+# test_ingest.py
+import os
+
+import pandas as pd
+
+from data_loader import build_model
+from ingest import DeltaIngestor
+
+DELTA_ROWS = 300
+
+
+def totals(data):
+    return data.aggregate(['year', 'country'], {'profit': 'sum', 'quantity': 'sum', 'discount': 'mean'})
+
+
+def assert_same(result, expected):
+    pd.testing.assert_frame_equal(result.astype({'country': str}), expected.astype({'country': str}),
+                                  check_dtype=False, rtol=1e-9)
+
+
+def test_delta_ingestor_appends_new_files(tables, model_and_plan, tmp_path):
+    full, _ = model_and_plan
+    fact = tables['fact']
+    base, _ = build_model(dict(tables, fact=fact.iloc[:-DELTA_ROWS].reset_index(drop=True)))
+    base.version = 'base'
+    delta = fact.iloc[-DELTA_ROWS:]
+    delta.iloc[:200].to_parquet(tmp_path / '1.parquet')
+
+    ingestor = DeltaIngestor(base, str(tmp_path), settle_seconds=0)
+    first = ingestor.refresh()
+    assert len(first) == len(fact) - 100
+    assert first.version != base.version
+    assert len(base) == len(fact) - DELTA_ROWS
+    # Без новых файлов модель та же
+    assert ingestor.refresh() is first
+
+    delta.iloc[200:].to_csv(tmp_path / '2.csv', index=False)
+    model = ingestor.refresh()
+    assert len(model) == len(fact)
+    assert model.load_stats['delta_files'] == ['1.parquet', '2.csv']
+    assert_same(totals(model.select()), totals(full.select()))
+    filters = {'years': [2019, 2020], 'managers': ['Матвей Крылов']}
+    assert_same(totals(model.select(**filters)), totals(full.select(**filters)))
+    if model.cube is not None:
+        cube_totals = model.cube.select(**filters).aggregate(['year'], {'profit': 'sum'})
+        pd.testing.assert_frame_equal(cube_totals, full.select(**filters).aggregate(['year'], {'profit': 'sum'}),
+                                      check_dtype=False, rtol=1e-9)
+    if model.rollups is not None:
+        monthly = model.rollups.series('month', ['profit'], years=[2020])
+        pd.testing.assert_frame_equal(monthly, full.rollups.series('month', ['profit'], years=[2020]),
+                                      check_dtype=False, rtol=1e-9)
+        daily = model.rollups.series('day', ['profit'], categories=['Женская обувь'])
+        pd.testing.assert_frame_equal(daily, full.rollups.series('day', ['profit'], categories=['Женская обувь']),
+                                      check_dtype=False, rtol=1e-9)
+
+
+def test_delta_ingestor_reapplies_changed_files(tables, tmp_path):
+    fact = tables['fact']
+    base, _ = build_model(dict(tables, fact=fact.iloc[:-DELTA_ROWS].reset_index(drop=True)))
+    path = tmp_path / 'new.csv'
+    fact.iloc[-DELTA_ROWS:].to_csv(path, index=False)
+    ingestor = DeltaIngestor(base, str(tmp_path), settle_seconds=0)
+    assert len(ingestor.refresh()) == len(fact)
+
+    fact.iloc[-50:].to_csv(path, index=False)
+    os.utime(path, ns=(0, 0))
+    assert len(ingestor.refresh()) == len(base) + 50
+
+
+def test_delta_ingestor_without_folder_returns_base(model_and_plan, tmp_path):
+    model, _ = model_and_plan
+    assert DeltaIngestor(model, str(tmp_path / 'missing')).refresh() is model
+
+
+def test_delta_ingestor_skips_unreadable_and_known_rows(tables, tmp_path):
+    fact = tables['fact']
+    base, _ = build_model(dict(tables, fact=fact.iloc[:-DELTA_ROWS].reset_index(drop=True)))
+    fact.iloc[-DELTA_ROWS:].to_csv(tmp_path / 'new.csv', index=False)
+    # Продажи, уже вошедшие в базовую загрузку, и файл с неверными столбцами
+    fact.iloc[:100].to_parquet(tmp_path / 'old.parquet')
+    (tmp_path / 'bad.csv').write_text('a,b\n1,2\n')
+    (tmp_path / 'copying.xlsx').write_bytes(b'PK\x03\x04')
+
+    ingestor = DeltaIngestor(base, str(tmp_path), settle_seconds=0)
+    model = ingestor.refresh()
+    assert len(model) == len(fact)
+    assert model.load_stats['delta_duplicates'] == 100
+    assert model.load_stats['delta_files'] == ['new.csv', 'old.parquet']
+    assert sorted(model.load_stats['delta_errors']) == ['bad.csv', 'copying.xlsx']
+    # Неизменённый файл с ошибкой не перечитывается, исправленный - применяется
+    assert ingestor.refresh() is model
+    os.remove(tmp_path / 'copying.xlsx')
+    fact.iloc[-DELTA_ROWS - 10:-DELTA_ROWS].to_csv(tmp_path / 'bad.csv', index=False)
+    os.utime(tmp_path / 'bad.csv', ns=(0, 0))
+    # Эти строки уже в базовой загрузке: дописывать нечего
+    fixed = ingestor.refresh()
+    assert len(fixed) == len(fact)
+    assert fixed.load_stats['delta_errors'] == {}
+    assert fixed.load_stats['delta_files'] == ['bad.csv', 'new.csv', 'old.parquet']
+
+
+def test_delta_ingestor_waits_for_files_to_settle(model_and_plan, tables, tmp_path):
+    model, _ = model_and_plan
+    tables['fact'].iloc[:10].to_csv(tmp_path / 'recent.csv', index=False)
+    assert DeltaIngestor(model, str(tmp_path), settle_seconds=60).refresh() is model
@@ -0,0 +1,61 @@
+# test_row_index.py
+import numpy as np
+import pandas as pd
+
+from row_index import RowIndex
+
+
+class Columns:
+    """Минимальная схема для RowIndex.build: столбцы по имени"""
+
+    def __init__(self, **columns):
+        self.columns = columns
+
+    def column_values(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+
+def make_index():
+    return RowIndex.build(Columns(
+        year=np.array([2016, 2017, 2016, 2018, 2017, 2016]),
+        country=pd.Categorical(['DE', 'BR', None, 'DE', 'RU', 'BR']),
+    ), ['year', 'country'])
+
+
+def test_postings_are_sorted_rows_of_each_value():
+    index = make_index()
+    assert list(index.postings['year']) == [2016, 2017, 2018]
+    np.testing.assert_array_equal(index.postings['year'][2016], [0, 2, 5])
+    np.testing.assert_array_equal(index.postings['country']['BR'], [1, 5])
+    # Пропуски в индекс не попадают
+    assert sum(len(rows) for rows in index.postings['country'].values()) == 5
+
+
+def test_rows_unions_values_and_returns_none_without_restriction():
+    index = make_index()
+    np.testing.assert_array_equal(index.rows('year', [2017, 2018]), [1, 3, 4])
+    assert index.rows('year', [2016, 2017, 2018]) is None
+    assert len(index.rows('year', [1999])) == 0
+    # Строки с пропуском не подходят ни под одно значение
+    np.testing.assert_array_equal(index.rows('country', ['DE', 'BR', 'RU']), [0, 1, 3, 4, 5])
+
+
+def test_select_intersects_conditions():
+    index = make_index()
+    np.testing.assert_array_equal(index.select({'year': [2016, 2017], 'country': ['BR']}), [1, 5])
+    np.testing.assert_array_equal(index.select({'year': [2016], 'country': ['RU']}), [])
+    # Пустой выбор в фильтре - без ограничения
+    assert index.select({'year': [], 'country': None}) is None
+
+
+def test_extend_matches_index_of_concatenated_rows():
+    first = Columns(year=np.array([2016, 2017, 2016]))
+    second = Columns(year=np.array([2018, 2016]))
+    extended = RowIndex.build(first, ['year']).extend(RowIndex.build(second, ['year']), offset=3)
+    combined = RowIndex.build(Columns(year=np.array([2016, 2017, 2016, 2018, 2016])), ['year'])
+    assert extended.n_rows == 5
+    for value, rows in combined.postings['year'].items():
+        np.testing.assert_array_equal(extended.postings['year'][value], rows)
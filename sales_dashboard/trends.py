@@ -0,0 +1,147 @@
+# trends.py
+"""Тренды продаж сразу для всех товаров и категорий.
+
+Одна группировка (товар или категория × год × месяц) раскладывается в
+матрицу «группа × месяц» по периодам календаря, и показатели считаются
+операциями numpy над всеми строками матрицы сразу, без цикла по товарам:
+
+- growth - изменение суммы за последние window месяцев к предыдущим window, %;
+- slope - наклон линейной регрессии по месяцам (изменение за месяц),
+  slope_pct - он же в процентах от среднего месяца;
+- net_attainment, gross_attainment - выполнение плана категории, % (план
+  задан по категориям, поэтому у товара - выполнение плана его категории).
+
+Источник данных - любой объект с методом aggregate (свёртка по месяцам
+из rollups.py, FactView, DuckDBSource и т.д.) или DataFrame.
+"""
+import numpy as np
+import pandas as pd
+
+from analysis import aggregate, monthly_plan
+
+# Уровень -> столбцы группы
+TREND_GROUPS = {
+    'category': ['categoryid', 'categoryname'],
+    'product': ['categoryid', 'categoryname', 'productname'],
+}
+PERIOD_COLUMNS = ['year', 'month']
+SCORE_COLUMNS = ['total', 'recent', 'previous', 'growth', 'slope', 'slope_pct', 'active_months', 'last_sale']
+
+
+def month_periods(table):
+    """Все месяцы от первого до последнего месяца table (если периоды календаря не заданы)"""
+    if table.empty:
+        return pd.DataFrame({'year': [], 'month': [], 'Date': pd.to_datetime([])})
+    months = pd.to_datetime(table[PERIOD_COLUMNS].assign(day=1))
+    dates = pd.date_range(months.min(), months.max(), freq='MS')
+    return pd.DataFrame({'year': dates.year, 'month': dates.month, 'Date': dates})
+
+
+def _month_positions(periods, frame):
+    """Номера месяцев periods для строк frame (-1 - месяца нет среди periods)"""
+    def month_number(table):
+        return table['year'].to_numpy(np.int64) * 12 + table['month'].to_numpy(np.int64)
+    return pd.Index(month_number(periods)).get_indexer(month_number(frame))
+
+
+def _sales_range(periods, table):
+    """Месяцы periods от первого до последнего месяца, в котором есть строки table"""
+    positions = _month_positions(periods, table)
+    positions = positions[positions >= 0]
+    if not len(positions):
+        return periods.iloc[:0]
+    return periods.iloc[positions.min():positions.max() + 1].reset_index(drop=True)
+
+
+def period_matrix(table, by, periods, measures):
+    """Группы table по by и матрицы {мера: массив (группа × период)}; строки вне periods не учитываются"""
+    grouped = table.groupby(by, observed=True, sort=True)
+    groups = grouped.size().reset_index()[by]
+    rows = grouped.ngroup().to_numpy()
+    columns = _month_positions(periods, table)
+    inside = columns >= 0
+    matrices = {}
+    for measure in measures:
+        matrix = np.zeros((len(groups), len(periods)))
+        np.add.at(matrix, (rows[inside], columns[inside]), table[measure].to_numpy(np.float64)[inside])
+        matrices[measure] = matrix
+    return groups, matrices
+
+
+def _ratio(numerator, denominator):
+    """numerator / denominator * 100 (NaN, где знаменатель равен 0)"""
+    result = np.full(np.shape(numerator), np.nan)
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result * 100
+
+
+def _plan_attainment(groups, periods, net, gross, plan):
+    """Выполнение плана категорий (строки groups) за месяцы periods, в которых есть план"""
+    plan_monthly = monthly_plan(plan, by=['category_id'])
+    categories = pd.Index(groups['categoryid'].drop_duplicates())
+    category_rows = categories.get_indexer(groups['categoryid'])
+    plan_rows = categories.get_indexer(plan_monthly['category_id'])
+    plan_columns = _month_positions(periods, plan_monthly)
+    inside = (plan_rows >= 0) & (plan_columns >= 0)
+
+    attainment = {}
+    for column, actual in [('Net_Plan', net), ('Gross_Plan', gross)]:
+        planned = np.zeros((len(categories), len(periods)))
+        np.add.at(planned, (plan_rows[inside], plan_columns[inside]), plan_monthly[column].to_numpy()[inside])
+        totals = np.zeros_like(planned)
+        np.add.at(totals, category_rows, actual)
+        # Продажи учитываются только за месяцы, на которые есть план
+        achieved = np.where(planned != 0, totals, 0).sum(axis=1)
+        attainment[column] = _ratio(achieved, planned.sum(axis=1))[category_rows]
+    return attainment['Net_Plan'], attainment['Gross_Plan']
+
+
+def trend_scores(data, level='product', periods=None, plan=None, measure='profit', window=12):
+    """Показатели тренда для каждого товара (level='product') или категории (level='category').
+
+    periods - месяцы календаря (столбцы year, month, Date) по возрастанию,
+    например TimeRollups.periods['month']; из них берутся месяцы от первой
+    до последней продажи в data (при фильтре по годам календарь шире
+    выборки). По умолчанию - все месяцы от первой до последней продажи.
+    plan - исходная таблица плана (без неё столбцов выполнения плана нет);
+    план учитывается только за эти месяцы.
+    """
+    by = TREND_GROUPS[level]
+    measures = list(dict.fromkeys([measure, 'netsalesamount', 'grosssalesamount']))
+    table = aggregate(data, by + PERIOD_COLUMNS, {column: 'sum' for column in measures})
+    periods = month_periods(table) if periods is None else _sales_range(periods, table)
+    if table.empty or periods.empty:
+        return pd.DataFrame(columns=by + SCORE_COLUMNS)
+    groups, matrices = period_matrix(table, by, periods, measures)
+    values = matrices[measure]
+    n_periods = values.shape[1]
+
+    recent = values[:, max(n_periods - window, 0):].sum(axis=1)
+    previous = values[:, max(n_periods - 2 * window, 0):max(n_periods - window, 0)].sum(axis=1)
+    mean = values.mean(axis=1)
+    # Наклон МНК по номеру месяца: сумма (t - t̄)(y - ȳ) / сумма (t - t̄)²
+    t = np.arange(n_periods) - (n_periods - 1) / 2
+    slope = (values - mean[:, None]) @ t / (t @ t) if n_periods > 1 else np.zeros(len(groups))
+    active = values != 0
+    last_active = n_periods - 1 - np.argmax(active[:, ::-1], axis=1)
+
+    scores = groups.assign(
+        total=values.sum(axis=1),
+        recent=recent,
+        previous=previous,
+        growth=_ratio(recent - previous, np.abs(previous)),
+        slope=slope,
+        slope_pct=_ratio(slope, np.abs(mean)),
+        active_months=active.sum(axis=1),
+        last_sale=pd.Series(periods['Date'].to_numpy()[last_active]).where(active.any(axis=1)),
+    )
+    if plan is not None:
+        scores['net_attainment'], scores['gross_attainment'] = _plan_attainment(
+            groups, periods, matrices['netsalesamount'], matrices['grosssalesamount'], plan)
+    return scores
+
+
+def delisting_candidates(scores, top_n=20):
+    """Товары с падающими продажами: рост и наклон отрицательны; сильнее падение - выше в списке"""
+    declining = scores[(scores['growth'] < 0) & (scores['slope'] < 0)]
+    return declining.sort_values(['slope_pct', 'growth'], kind='stable').head(top_n).reset_index(drop=True)
@@ -0,0 +1,119 @@
+# watcher.py
+"""Фоновая перезагрузка данных при изменении исходных книг.
+
+Поток раз в interval секунд сверяет версию исходных файлов (пути, mtime,
+размеры - см. data_loader.sources_version). Когда версия изменилась и
+держится неизменной один интервал (книга дописана), поток строит новую
+модель вне запросов пользователей и атомарно подменяет снимок данных.
+Перезапуск берёт снимок один раз в начале, поэтому доигрывает на старой
+версии, а следующие перезапуски видят новую. Если перезагрузка не удалась,
+остаётся прежний снимок, а ошибка доступна в status().
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import settings
+from data_loader import load_data, sources_version
+
+logger = logging.getLogger(__name__)
+
+# Неизменяемый снимок данных: версия, модель, план, время загрузки и её длительность
+Snapshot = namedtuple('Snapshot', ['version', 'model', 'plan', 'loaded_at', 'reload_seconds'])
+
+
+class DatasetWatcher:
+    """Текущий снимок данных и поток, который его обновляет"""
+
+    def __init__(self, loader=None, data_dir=None, interval=None):
+        self.loader = loader or load_data
+        self.data_dir = data_dir or settings.DATA_DIR
+        self.interval = settings.WATCH_INTERVAL if interval is None else interval
+        self.snapshot = None
+        self.reloading = False
+        self.reloads = 0
+        self.last_error = None
+        self._failed_version = None
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Запускает поток; первая загрузка выполняется в нём же"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='dataset-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def current(self, timeout=None):
+        """Текущий снимок. Ждать приходится только до самой первой загрузки."""
+        if not self._ready.wait(timeout):
+            raise TimeoutError(f'Данные не загрузились за {timeout} с')
+        if self.snapshot is None:
+            raise RuntimeError(f'Не удалось загрузить данные: {self.last_error}')
+        return self.snapshot
+
+    def status(self):
+        snapshot = self.snapshot
+        return {
+            'version': snapshot.version if snapshot else None,
+            'loaded_at': snapshot.loaded_at if snapshot else None,
+            'reload_seconds': snapshot.reload_seconds if snapshot else None,
+            'reloading': self.reloading,
+            'reloads': self.reloads,
+            'last_error': self.last_error,
+        }
+
+    def _reload(self):
+        self.reloading = True
+        started = time.perf_counter()
+        try:
+            model, plan = self.loader(self.data_dir)
+        except Exception as e:  # прежний снимок продолжает обслуживать запросы
+            logger.exception('Ошибка перезагрузки данных')
+            self.last_error = f'{type(e).__name__}: {e}'
+            return False
+        finally:
+            self.reloading = False
+        # Подмена одной ссылкой: перезапуски видят либо старый, либо новый снимок целиком
+        self.snapshot = Snapshot(model.version, model, plan,
+                                 datetime.now(timezone.utc).isoformat(), time.perf_counter() - started)
+        self.reloads += 1
+        self.last_error = None
+        logger.info('Загружена версия данных %s за %.2f с', model.version, self.snapshot.reload_seconds)
+        return True
+
+    def _run(self):
+        try:
+            if not self._reload():
+                self._failed_version = sources_version(self.data_dir)
+        except OSError as e:  # книги нет: версию узнаем на следующей проверке
+            self.last_error = f'{type(e).__name__}: {e}'
+        finally:
+            # Сессии ждут первую загрузку в current(), даже если она не удалась
+            self._ready.set()
+        observed = None
+        while not self._stop.wait(self.interval):
+            try:
+                version = sources_version(self.data_dir)
+            except OSError as e:  # файл удалён или переименовывается
+                self.last_error = f'{type(e).__name__}: {e}'
+                continue
+            current = self.snapshot.version if self.snapshot else None
+            if version in (current, self._failed_version):
+                observed = None
+                continue
+            if version != observed:
+                # Ждём ещё интервал: книга могла быть сохранена не до конца
+                observed = version
+                continue
+            observed = None
+            if not self._reload():
+                self._failed_version = version